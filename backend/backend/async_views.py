@@ -0,0 +1,94 @@
+"""Native async endpoints next to the DRF views.
+
+DRF views are synchronous, so under ASGI every request holds a thread while
+it waits on the database or the cache. The hot endpoints are plain Django
+async views instead. They reuse the DRF serializers, filters, pagination and
+exception handling, but authenticate, query and cache through the async
+APIs, and answer with an ordinary DRF Response rendered as JSON.
+
+Other methods on the same URL are handed to the regular DRF view.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from users.authentication import CachedJWTAuthentication
+
+from . import profiling
+
+
+def _finalize(response, request):
+    if not isinstance(response, Response):
+        return response  # e.g. a streaming response
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()  # the JSON one
+    response.accepted_renderer = renderer
+    response.accepted_media_type = renderer.media_type
+    response.renderer_context = {"request": request, "response": response}
+    patch_vary_headers(response, ("Accept",))
+    with profiling.measure("render"):
+        return response.render()
+
+
+async def _authenticate(request, authenticator, query_auth):
+    if request.authenticators:
+        # APIClient.force_authenticate() installed a ForcedAuthentication
+        if request.user.is_authenticated:
+            return
+        raise exceptions.NotAuthenticated()
+    result = await authenticator.aauthenticate(request._request)
+    if result is None and query_auth is not None:
+        result = await query_auth(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    request.user, request.auth = result
+
+
+def async_api_view(methods=("GET",), fallback=None, authenticated=True, query_auth=None):
+    """Serve ``methods`` from the decorated coroutine, which receives a DRF
+    Request and returns a DRF Response (or any other HttpResponse).
+
+    Other methods go to the synchronous ``fallback`` view if there is one,
+    or get a 405. ``query_auth`` is a coroutine function taking the request
+    and returning ``(user, auth)`` or None, tried when there is no
+    Authorization header; for clients such as EventSource that can't set
+    headers. Never accept access tokens there: URLs get logged.
+    """
+    methods = {method.upper() for method in methods}
+    if "GET" in methods:
+        methods.add("HEAD")
+
+    def decorator(handler):
+        @csrf_exempt
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method not in methods and fallback is not None:
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+
+            authenticator = CachedJWTAuthentication()
+            drf_request = Request(
+                request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES], authenticators=()
+            )
+            try:
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                if authenticated:
+                    await _authenticate(drf_request, authenticator, query_auth)
+                response = await handler(drf_request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    exc.auth_header = authenticator.authenticate_header(drf_request)
+                response = exception_handler(exc, {"request": drf_request, "view": None})
+                if response is None:
+                    raise
+            return _finalize(response, drf_request)
+
+        return view
+
+    return decorator
@@ -0,0 +1,296 @@
+"""Runtime metrics in the Prometheus text format, served at /metrics.
+
+Counters and histograms live in memory and are updated under a lock, which
+costs well under a microsecond per update. The metrics:
+
+    http_request_duration_seconds{route,method}   histogram
+    http_responses_total{route,method,status}      counter
+    http_request_db_queries{route}                 histogram, SQL queries per request
+    order_status_transitions_total{from,to}        counter
+    orders_created_total                           counter
+    order_image_uploads_total                      counter
+    order_image_upload_bytes_total                 counter
+
+``route`` is the URL name (``orders-list``, ``login``, ``token_refresh``,
+...), or ``unmatched`` for paths no URL matched. Request metrics are fed by
+backend.profiling.ProfilingMiddleware.
+
+Each worker process has its own values. With METRICS_DIR set, every process
+writes them to ``<METRICS_DIR>/<pid>-<start>.json`` every
+METRICS_FLUSH_SECONDS from a daemon timer thread (and at exit), so requests
+never wait on the file, and /metrics adds up all the files, so any worker
+can answer a scrape. Files of exited workers are kept, so their
+counts don't go missing; empty the directory when the server is (re)started.
+Without METRICS_DIR, /metrics reports the process that serves it.
+
+/metrics needs ``Authorization: Bearer <METRICS_TOKEN>``; without a
+METRICS_TOKEN it is off.
+"""
+import atexit
+import bisect
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+_registry = {}  # name -> metric, in registration order
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}  # label values -> value
+        _registry[name] = self
+
+    def samples(self, values):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def merge(self, current, other):
+        return current + other
+
+    def samples(self, values):
+        for labels, value in values.items():
+            yield self.name, self.labels, labels, value
+
+
+class Histogram(_Metric):
+    """Per label set: a count per bucket (not cumulative), then the sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        # bisect_left: a value equal to a bound belongs in that bucket (le)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def merge(self, current, other):
+        return [a + b for a, b in zip(current, other)]
+
+    def samples(self, values):
+        names = self.labels + ("le",)
+        for labels, counts in values.items():
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                total += count
+                yield f"{self.name}_bucket", names, labels + (_number(bound),), total
+            yield f"{self.name}_sum", self.labels, labels, counts[-1]
+            yield f"{self.name}_count", self.labels, labels, total
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to produce the response, by URL name.", ("route", "method")
+)
+RESPONSES = Counter("http_responses_total", "Responses by URL name and status code.", ("route", "method", "status"))
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL queries per request, by URL name.", ("route",), buckets=QUERY_BUCKETS
+)
+ORDER_TRANSITIONS = Counter(
+    "order_status_transitions_total", "Committed order status changes.", ("from", "to")
+)
+ORDERS_CREATED = Counter("orders_created_total", "Committed new orders.")
+IMAGE_UPLOADS = Counter("order_image_uploads_total", "Committed order item image uploads.")
+IMAGE_UPLOAD_BYTES = Counter("order_image_upload_bytes_total", "Size of the committed image uploads.")
+
+
+def route_of(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name
+
+
+def observe_request(request, response, seconds, queries):
+    route = route_of(request)
+    REQUEST_SECONDS.observe(seconds, route, request.method)
+    RESPONSES.inc(route, request.method, str(response.status_code))
+    REQUEST_QUERIES.observe(queries, route)
+
+
+def order_transition(old, new):
+    """Count a status change once the current transaction commits."""
+    if old != new:
+        transaction.on_commit(partial(ORDER_TRANSITIONS.inc, old, new))
+
+
+def order_created():
+    transaction.on_commit(ORDERS_CREATED.inc)
+
+
+def images_uploaded(files):
+    files = list(files)
+    if files:
+        transaction.on_commit(partial(_images_uploaded, len(files), sum(f.size or 0 for f in files)))
+
+
+def _images_uploaded(count, size):
+    IMAGE_UPLOADS.inc(amount=count)
+    IMAGE_UPLOAD_BYTES.inc(amount=size)
+
+
+# Multi-process support
+
+_flush_lock = threading.Lock()
+_state = {"pid": None, "path": None}
+
+
+def _snapshot():
+    with _lock:
+        return {
+            name: [[list(labels), value] for labels, value in metric.values.items()]
+            for name, metric in _registry.items()
+            if metric.values
+        }
+
+
+def _own_file():
+    if _state["pid"] != os.getpid():
+        _state["pid"] = os.getpid()
+        _state["path"] = os.path.join(settings.METRICS_DIR, f"{os.getpid()}-{time.time_ns()}.json")
+    return _state["path"]
+
+
+def flush():
+    """Write this process's values to its file in METRICS_DIR."""
+    if not settings.METRICS_DIR:
+        return
+    # One writer at a time, so an older snapshot never replaces a newer one
+    with _flush_lock:
+        path = _own_file()
+        temp = f"{path}.tmp"
+        try:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(_snapshot(), f, separators=(",", ":"))
+            # Readers see the old file or the new one, never half of one
+            os.replace(temp, path)
+        except OSError:
+            logger.exception("Could not write the metrics file %s", path)
+
+
+def _flush_periodically():
+    flush()
+    _start_timer()
+
+
+def _start_timer():
+    if not settings.METRICS_DIR:
+        return
+    timer = threading.Timer(settings.METRICS_FLUSH_SECONDS, _flush_periodically)
+    timer.daemon = True
+    timer.start()
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero; its parent's counts are in the
+    # parent's file. Threads don't survive a fork, so it needs its own timer.
+    global _lock, _flush_lock
+    _lock, _flush_lock = threading.Lock(), threading.Lock()
+    for metric in _registry.values():
+        metric.values = {}
+    _state.update(pid=None, path=None)
+    _start_timer()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(flush)
+_start_timer()
+
+
+def collect():
+    """{name: {label values: value}} across the processes."""
+    if not settings.METRICS_DIR:
+        snapshots = [_snapshot()]
+    else:
+        flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # removed since the glob
+    merged = {name: {} for name in _registry}
+    for snapshot in snapshots:
+        for name, entries in snapshot.items():
+            metric = _registry.get(name)
+            if metric is None:
+                continue  # written by an older version
+            values = merged[name]
+            for labels, value in entries:
+                labels = tuple(labels)
+                values[labels] = metric.merge(values[labels], value) if labels in values else value
+    return merged
+
+
+# Text exposition
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(values):
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for sample, names, labels, value in metric.samples(values.get(name, {})):
+            if names:
+                pairs = ",".join(f'{key}="{_escape(label)}"' for key, label in zip(names, labels))
+                sample = f"{sample}{{{pairs}}}"
+            lines.append(f"{sample} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    given = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
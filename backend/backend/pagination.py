@@ -0,0 +1,118 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination that seeks on the full ordering tuple.
+
+    DRF's CursorPagination only stores the first ordering field and falls back
+    to an OFFSET for ties. Here the cursor holds a value for every field in
+    ``ordering``, so each page is a single indexed range scan. The last field
+    must be unique (normally ``id``) and none of them may be NULL.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page([obj async for obj in queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, values = False, None
+        else:
+            reverse = self.cursor.reverse
+            values = self._decode_position(self.cursor.position)
+
+        self._reverse, self._seeking = reverse, values is not None
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            try:
+                queryset = queryset.filter(self._seek(ordering, values))
+            except (ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # Fetch one extra row to know whether there is a following page
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+
+        if self._reverse:
+            self.page.reverse()
+            self.has_next = self._seeking
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self._seeking
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._encode_position(self.page[-1])
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._encode_position(self.page[0])
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _encode_position(self, instance):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip("-")
+            attr = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(str(attr))
+        return json.dumps(values, separators=(",", ":"))
+
+    def _decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(f[1:] if f.startswith("-") else f"-{f}" for f in ordering)
+
+    @staticmethod
+    def _seek(ordering, values):
+        """Rows strictly after ``values`` in ``ordering``, compared as a tuple."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
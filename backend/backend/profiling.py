@@ -0,0 +1,285 @@
+"""Per-request timings: Server-Timing headers, a slow-request log, profiles.
+
+ProfilingMiddleware (first in MIDDLEWARE) times each request and adds
+
+    Server-Timing: total;dur=41.2, db;dur=12.8;desc="9 queries", view;dur=38.0,
+                   auth;dur=0.4, serialize;dur=17.9, render;dur=1.6
+
+``db`` is every SQL query of the request, on any connection and thread (the
+ORM calls of async views run in a worker thread). ``view`` runs from the
+view being called to its response, and includes ``auth`` and ``serialize``.
+``render`` is DRF rendering the response body. Other code can time its own
+part with ``measure(name)``. The total and the query count also go to the
+request metrics of backend.metrics.
+
+Requests slower than PROFILING_SLOW_MS are logged to ``backend.profiling``
+(a PROFILING_SLOW_SAMPLE_RATE share of them) as one JSON line, with the SQL
+statements that ran most often.
+
+With PROFILING_PROFILER set to ``cprofile`` (or ``pyinstrument``, if
+installed), a PROFILING_PROFILE_SAMPLE_RATE share of requests run under the
+profiler, and those slower than PROFILING_PROFILE_MS are saved to
+PROFILING_PROFILE_DIR. Profilers only see the thread they start in, so under
+ASGI they show the event loop rather than the ORM work.
+"""
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.functional import SimpleLazyObject, empty
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+# Query parameters that grant access (event stream tickets, signed media
+# URLs, tokens from old clients); kept out of the slow-request log
+SECRET_PARAMS = {"token", "ticket", "s"}
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.queries = 0
+        self.db = 0.0
+        self.statements = {}  # sql -> [count, seconds]
+        self.view_started = None
+        self.view_done = None
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def query(self, sql, seconds):
+        self.queries += 1
+        self.db += seconds
+        entry = self.statements.setdefault(sql, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def top_statements(self, limit):
+        ranked = sorted(self.statements.items(), key=lambda item: (-item[1][0], -item[1][1]))
+        return [
+            {"sql": sql[:500], "count": count, "ms": round(seconds * 1000, 2)}
+            for sql, (count, seconds) in ranked[:limit]
+        ]
+
+
+@contextmanager
+def measure(name):
+    """Add the time spent in the block to span ``name`` of the current request."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add(name, time.perf_counter() - start)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query(sql, time.perf_counter() - start)
+
+
+def _install(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        # At the front: execute_wrapper() blocks pop the last entry on exit
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+# Connections are per thread and made on demand; hook each one as it opens
+connection_created.connect(_install)
+
+
+class _Profiler:
+    """cProfile or pyinstrument around one request."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        if kind == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise ImproperlyConfigured("PROFILING_PROFILER is pyinstrument but it is not installed.")
+            self.profiler = Profiler(async_mode="enabled")
+        else:
+            self.profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.kind == "pyinstrument":
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def save(self, request, elapsed_ms):
+        os.makedirs(settings.PROFILING_PROFILE_DIR, exist_ok=True)
+        slug = request.path.strip("/").replace("/", "_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{slug}-{elapsed_ms:.0f}ms"
+        if self.kind == "pyinstrument":
+            path = os.path.join(settings.PROFILING_PROFILE_DIR, f"{name}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.profiler.output_html())
+        else:
+            # Open with: python -m pstats <file>, or snakeviz
+            path = os.path.join(settings.PROFILING_PROFILE_DIR, f"{name}.prof")
+            self.profiler.dump_stats(path)
+        return path
+
+
+def _logged_path(request):
+    if not SECRET_PARAMS & request.GET.keys():
+        return request.get_full_path()
+    query = [(key, value) for key, values in request.GET.lists() if key not in SECRET_PARAMS for value in values]
+    return request.path + ("?" + urlencode(query) if query else "")
+
+
+def _user_id(request):
+    # Only a user that is already resolved: evaluating the lazy session user
+    # would query the database, which isn't allowed on the event loop
+    user = request.__dict__.get("user")
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return getattr(user, "pk", None)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django runs sync hooks of async middleware through
+            # sync_to_async; async ones stay on the event loop
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, token, profiler = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+            _current.reset(token)
+        return self._finish(request, response, stats, profiler)
+
+    async def __acall__(self, request):
+        stats, token, profiler = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+            _current.reset(token)
+        return self._finish(request, response, stats, profiler)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self._view_called()
+
+    def process_template_response(self, request, response):
+        # Called once the view has returned, before the response is rendered
+        return self._view_returned(response)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self._view_called()
+
+    async def _aprocess_template_response(self, request, response):
+        return self._view_returned(response)
+
+    @staticmethod
+    def _view_called():
+        stats = _current.get()
+        if stats is not None:
+            stats.view_started = time.perf_counter()
+
+    @staticmethod
+    def _view_returned(response):
+        stats = _current.get()
+        if stats is not None and stats.view_started is not None:
+            stats.view_done = rendering = time.perf_counter()
+            response.add_post_render_callback(lambda r: stats.add("render", time.perf_counter() - rendering))
+        return response
+
+    def _start(self):
+        stats = RequestStats()
+        token = _current.set(stats)
+        profiler = None
+        if settings.PROFILING_PROFILER and random.random() < settings.PROFILING_PROFILE_SAMPLE_RATE:
+            profiler = _Profiler(settings.PROFILING_PROFILER)
+            try:
+                profiler.start()
+            except ValueError:
+                profiler = None  # another profiler is active in this thread
+        return stats, token, profiler
+
+    def _finish(self, request, response, stats, profiler):
+        finished = time.perf_counter()
+        total_ms = (finished - stats.started) * 1000
+        if stats.view_started is not None:
+            stats.add("view", (stats.view_done or finished) - stats.view_started)
+        if settings.METRICS_ENABLED:
+            metrics.observe_request(request, response, finished - stats.started, stats.queries)
+
+        if settings.PROFILING_SERVER_TIMING:
+            timings = [f"total;dur={total_ms:.1f}", f'db;dur={stats.db * 1000:.1f};desc="{stats.queries} queries"']
+            timings += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stats.spans.items()]
+            response["Server-Timing"] = ", ".join(timings)
+
+        profile_path = None
+        if profiler is not None and total_ms >= settings.PROFILING_PROFILE_MS:
+            try:
+                profile_path = profiler.save(request, total_ms)
+            except OSError:
+                logger.exception("Could not save the request profile")
+
+        if total_ms >= settings.PROFILING_SLOW_MS and random.random() < settings.PROFILING_SLOW_SAMPLE_RATE:
+            record = {
+                "method": request.method,
+                "path": _logged_path(request),
+                "status": response.status_code,
+                "user": _user_id(request),
+                "total_ms": round(total_ms, 1),
+                "db_ms": round(stats.db * 1000, 1),
+                "queries": stats.queries,
+                **{f"{name}_ms": round(seconds * 1000, 1) for name, seconds in stats.spans.items()},
+                "top_sql": stats.top_statements(settings.PROFILING_TOP_SQL),
+            }
+            if profile_path:
+                record["profile"] = profile_path
+            logger.warning("Slow request %s", json.dumps(record, ensure_ascii=False), extra={"request_profile": record})
+        return response
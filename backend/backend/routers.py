@@ -0,0 +1,53 @@
+"""Sends heavy read-only queries to the ``replica`` database, when there is one.
+
+Code opts in with ``read_replica()``, as a context manager or a decorator:
+
+    with read_replica():
+        totals = Order.objects.aggregate(...)
+
+Everything else, and every write, uses ``default``. Replica reads may lag
+behind the primary, so only use it where slightly stale data is fine
+(reports, exports, staff lists). The flag lives in a context variable, so it
+holds across sync_to_async and doesn't leak into other requests.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = "replica"
+
+_use_replica = contextvars.ContextVar("use_replica", default=False)
+
+
+def replica_alias():
+    return REPLICA if REPLICA in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def read_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # Related lookups and prefetches follow the object they start from
+            return instance._state.db
+        if _use_replica.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Also for objects that were read from the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
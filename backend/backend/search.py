@@ -0,0 +1,99 @@
+"""Full-text search tables shared by the order and customer searches.
+
+Each searchable model gets a side table ``<table>_fts`` with one row per
+object: ``rowid`` (the object's id) and ``body`` (the text to search). It is
+an FTS5 virtual table on SQLite, and a plain table with a GIN index on
+``to_tsvector('simple', body)`` on PostgreSQL. An unmanaged model with a
+SearchTextField maps it, so queries join it like any other relation:
+
+    Order.objects.filter(search__body__match=q).annotate(search_rank=Rank("search__body", q))
+
+``Rank`` is lower for better matches on both databases.
+"""
+from django.db import NotSupportedError, models
+from django.db.models import Lookup
+
+# Devanagari vowel signs are combining marks (M*); without them in the token
+# categories FTS5 would split Nepali words apart
+SQLITE_TOKENIZER = "unicode61 remove_diacritics 2 categories 'L* N* Co M*'"
+
+
+def create_table(schema_editor, table, source_table):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {table} USING fts5(body, tokenize=\"{SQLITE_TOKENIZER}\", prefix='2 3')"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE TABLE {table} (rowid bigint PRIMARY KEY REFERENCES {source_table}(id) "
+            f"ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, body text NOT NULL)"
+        )
+        schema_editor.execute(f"CREATE INDEX {table}_idx ON {table} USING gin (to_tsvector('simple', body))")
+    else:
+        raise NotSupportedError(f"Full-text search is not implemented for {vendor}.")
+
+
+def drop_table(schema_editor, table):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def _terms(text):
+    # Whitespace only: \w would split Devanagari words at their vowel signs
+    for quote in ('"', "'", "\\"):
+        text = text.replace(quote, " ")
+    return text.split()
+
+
+def to_query(text, vendor):
+    """Every word must match, each as a prefix ("9841" finds the full number)."""
+    terms = _terms(text)
+    if vendor == "sqlite":
+        return " ".join(f'"{term}"*' for term in terms)
+    if vendor == "postgresql":
+        return " & ".join(f"'{term}':*" for term in terms)
+    raise NotSupportedError(f"Full-text search is not implemented for {vendor}.")
+
+
+def has_terms(text):
+    return bool(_terms(text or ""))
+
+
+def _table(column_sql):
+    # '"orders_order_fts"."body"' -> '"orders_order_fts"' (whatever the join alias)
+    return column_sql.rsplit(".", 1)[0]
+
+
+class SearchTextField(models.TextField):
+    """The ``body`` column of a search table."""
+
+
+@SearchTextField.register_lookup
+class Match(Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        query = to_query(self.rhs, connection.vendor)
+        if connection.vendor == "sqlite":
+            return f"{_table(lhs)} MATCH %s", [*lhs_params, query]
+        return f"to_tsvector('simple', {lhs}) @@ to_tsquery('simple', %s)", [*lhs_params, query]
+
+
+class Rank(models.Func):
+    """Relevance of the joined search row for ``text``; lower is better."""
+
+    output_field = models.FloatField()
+
+    def __init__(self, body, text):
+        super().__init__(models.F(body))
+        self.text = text
+
+    def as_sql(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        query = to_query(self.text, connection.vendor)
+        if connection.vendor == "sqlite":
+            # bm25() is already negative, more so for better matches; it
+            # scores against the MATCH that Match puts in the WHERE clause
+            return f"bm25({_table(column)})", params
+        return f"-ts_rank(to_tsvector('simple', {column}), to_tsquery('simple', %s))", [*params, query]
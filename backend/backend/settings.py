@@ -34,9 +34,12 @@ INSTALLED_APPS = [
     'orders',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'backend.profiling.ProfilingMiddleware',  # first, so it times all the others
+    'backend.compression.CompressionMiddleware',  # before anything that writes the body
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,12 +73,58 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Configured from DB_* variables; a read replica from DB_REPLICA_* (see
+# backend/routers.py). SQLite runs in WAL mode so reads don't wait for
+# writers, and writers wait up to DB_BUSY_TIMEOUT seconds instead of
+# failing with "database is locked". On PostgreSQL connections come from
+# psycopg's pool (pip install "psycopg[pool]"), which is also what to use
+# under ASGI, where DB_CONN_MAX_AGE > 0 does not reuse connections.
+def database(prefix, default_name=None):
+    engine = os.getenv(f"{prefix}ENGINE", "django.db.backends.sqlite3")
+    config = {
+        'ENGINE': engine,
+        'NAME': os.getenv(f"{prefix}NAME", default_name),
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", "0")),
+        'CONN_HEALTH_CHECKS': True,
     }
+    if engine == "django.db.backends.sqlite3":
+        config['OPTIONS'] = {
+            'timeout': int(os.getenv("DB_BUSY_TIMEOUT", "5")),
+            # Take the write lock when the transaction starts, so two
+            # writers queue on busy_timeout instead of deadlocking
+            'transaction_mode': "IMMEDIATE",
+            'init_command': (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA temp_store=MEMORY;"
+                "PRAGMA cache_size=-20000;"
+                "PRAGMA mmap_size=134217728;"
+            ),
+        }
+    else:
+        config.update({
+            'USER': os.getenv(f"{prefix}USER", ""),
+            'PASSWORD': os.getenv(f"{prefix}PASSWORD", ""),
+            'HOST': os.getenv(f"{prefix}HOST", ""),
+            'PORT': os.getenv(f"{prefix}PORT", ""),
+        })
+        if engine == "django.db.backends.postgresql" and os.getenv("DB_POOL", "True") == "True":
+            config['CONN_MAX_AGE'] = 0  # the pool manages connection lifetime
+            config['OPTIONS'] = {'pool': {
+                'min_size': int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                'max_size': int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            }}
+    return config
+
+
+DATABASES = {
+    'default': database("DB_", str(BASE_DIR / 'db.sqlite3')),
 }
+if os.getenv("DB_REPLICA_NAME"):
+    DATABASES['replica'] = database("DB_REPLICA_")
+    # Tests read through the primary
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ["backend.routers.ReplicaRouter"]
 
 
 # Password validation
@@ -117,13 +166,101 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Order version stamps and cached order responses (orders/caching.py) must be
+# shared by all worker processes; point CACHE_BACKEND at Redis or Memcached
+# when running more than one process
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.getenv("CACHE_LOCATION", ""),
+    }
+}
+ORDER_RESPONSE_CACHE_TIMEOUT = int(os.getenv("ORDER_RESPONSE_CACHE_TIMEOUT", "300"))
+# Users resolved from JWTs (users/authentication.py)
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", "300"))
+
+# Refresh-token blacklist prefilter and batched token writes (users/blacklist.py)
+TOKEN_BLACKLIST_FILTER_CAPACITY = int(os.getenv("TOKEN_BLACKLIST_FILTER_CAPACITY", "100000"))
+TOKEN_BLACKLIST_FILTER_REBUILD_SECONDS = int(os.getenv("TOKEN_BLACKLIST_FILTER_REBUILD_SECONDS", "3600"))
+TOKEN_OUTSTANDING_BATCH_SIZE = int(os.getenv("TOKEN_OUTSTANDING_BATCH_SIZE", "500"))
+TOKEN_OUTSTANDING_FLUSH_SECONDS = float(os.getenv("TOKEN_OUTSTANDING_FLUSH_SECONDS", "2"))
+
+# Threads per process for password hashing on login (users/hashing.py)
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", str(os.cpu_count() or 2)))
+
+# In-process background tasks (backend/tasks.py), e.g. image processing
+BACKGROUND_TASK_WORKERS = int(os.getenv("BACKGROUND_TASK_WORKERS", "2"))
+BACKGROUND_TASKS_EAGER = os.getenv("BACKGROUND_TASKS_EAGER", "False") == "True"
+
+# Order change events (orders/events.py). Use orders.events.CacheBroker with a
+# shared cache when running more than one worker process
+ORDER_EVENTS_BACKEND = os.getenv("ORDER_EVENTS_BACKEND", "orders.events.LocalBroker")
+ORDER_EVENTS_QUEUE_SIZE = int(os.getenv("ORDER_EVENTS_QUEUE_SIZE", "100"))
+ORDER_EVENTS_HEARTBEAT_SECONDS = int(os.getenv("ORDER_EVENTS_HEARTBEAT_SECONDS", "15"))
+ORDER_EVENTS_POLL_SECONDS = float(os.getenv("ORDER_EVENTS_POLL_SECONDS", "0.5"))
+ORDER_EVENTS_RETENTION_SECONDS = int(os.getenv("ORDER_EVENTS_RETENTION_SECONDS", "60"))
+ORDER_EVENTS_TICKET_SECONDS = int(os.getenv("ORDER_EVENTS_TICKET_SECONDS", "30"))
+
+# Per-request timings (backend/profiling.py): Server-Timing headers, a log of
+# a sample of slow requests, and opt-in profiles (PROFILING_PROFILER=cprofile
+# or pyinstrument) of sampled requests slower than PROFILING_PROFILE_MS
+PROFILING_SERVER_TIMING = os.getenv("PROFILING_SERVER_TIMING", "True") == "True"
+PROFILING_SLOW_MS = float(os.getenv("PROFILING_SLOW_MS", "500"))
+PROFILING_SLOW_SAMPLE_RATE = float(os.getenv("PROFILING_SLOW_SAMPLE_RATE", "1.0"))
+PROFILING_TOP_SQL = int(os.getenv("PROFILING_TOP_SQL", "5"))
+PROFILING_PROFILER = os.getenv("PROFILING_PROFILER", "")
+PROFILING_PROFILE_SAMPLE_RATE = float(os.getenv("PROFILING_PROFILE_SAMPLE_RATE", "0.1"))
+PROFILING_PROFILE_MS = float(os.getenv("PROFILING_PROFILE_MS", "1000"))
+PROFILING_PROFILE_DIR = os.getenv("PROFILING_PROFILE_DIR", str(BASE_DIR / "profiles"))
+
+# backend/metrics.py: Prometheus metrics at /metrics for scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>" (off without a token). Set
+# METRICS_DIR to a directory shared by the worker processes of one server
+# to report all of them, and empty it on every (re)start
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+
+# backend/renderers.py: orjson for the API's JSON, if installed
+FAST_JSON = os.getenv("FAST_JSON", "True") == "True"
+
+# backend/compression.py: brotli (if installed) or gzip for responses of at
+# least COMPRESSION_MIN_BYTES, when the client accepts it
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "True") == "True"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+# Unreferenced media younger than this is left for cleanup_order_media
+ORDER_MEDIA_GRACE_SECONDS = int(os.getenv("ORDER_MEDIA_GRACE_SECONDS", "60"))
+# Order images at MEDIA_URL (orders/media.py): signed URLs stay the same
+# for ORDER_MEDIA_URL_TTL seconds and last one to two of those. Set
+# ORDER_MEDIA_DELIVERY to x-accel-redirect (nginx) or x-sendfile (Apache) to
+# have the proxy send the files
+ORDER_MEDIA_URL_TTL = int(os.getenv("ORDER_MEDIA_URL_TTL", str(24 * 60 * 60)))
+ORDER_MEDIA_MAX_AGE = int(os.getenv("ORDER_MEDIA_MAX_AGE", str(365 * 24 * 60 * 60)))
+ORDER_MEDIA_DELIVERY = os.getenv("ORDER_MEDIA_DELIVERY", "")
+ORDER_MEDIA_ACCEL_PREFIX = os.getenv("ORDER_MEDIA_ACCEL_PREFIX", "/protected-media/")
+
 AUTH_USER_MODEL = 'users.User'
 
 
 # settings.py
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-EMAIL_HOST_USER = 'test@example.com'  # just a placeholder
-EMAIL_HOST_PASSWORD = 'password'  # just a placeholder
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.getenv("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "25"))
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "False") == "True"
+EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "10"))
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", 'test@example.com')  # just a placeholder
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", 'password')  # just a placeholder
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Email outbox (users/outbox.py): messages per SMTP connection, and retries
+# after 30s, 60s, 120s, ... up to an hour apart
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_RETRY_SECONDS = int(os.getenv("OUTBOX_RETRY_SECONDS", "30"))
+OUTBOX_MAX_RETRY_SECONDS = int(os.getenv("OUTBOX_MAX_RETRY_SECONDS", "3600"))
 
 
 
@@ -136,11 +273,21 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # backend/renderers.py: orjson when installed, else the same as DRF's
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.FastJSONRenderer' if FAST_JSON else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.renderers.FastJSONParser' if FAST_JSON else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {
@@ -149,4 +296,7 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "users.blacklist.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.blacklist.TokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER": "users.blacklist.TokenVerifySerializer",
 }
@@ -0,0 +1,53 @@
+"""In-process background work queue.
+
+Tasks are handed to a small thread pool that lives inside each web worker, so
+nothing external (broker, separate worker service) has to run. Work queued
+here is lost if the process exits, so anything queued must be safe to redo
+later, for example by a management command that picks up unfinished rows.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_TASK_WORKERS,
+                    thread_name_prefix="background-task",
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(func, "__name__", func))
+    finally:
+        # Worker threads are long-lived; don't leave their connections open
+        connections.close_all()
+
+
+def enqueue(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on the background pool.
+
+    With ``BACKGROUND_TASKS_EAGER`` the call happens inline instead, which is
+    what tests want.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        func(*args, **kwargs)
+        return
+    _get_executor().submit(_run, func, args, kwargs)
@@ -2,14 +2,18 @@ from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
 from django.conf import settings
-from django.conf.urls.static import static
+
+from orders import media
+
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/", include("users.urls")),
     path("api/", include("orders.urls")),
+    path("metrics", metrics_view, name="metrics"),
+    # Order images, for their owner and staff only; see orders/media.py
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:name>", media.serve, name="order-media"),
     
     path("", lambda request: JsonResponse({"message": "Welcome to the API"})),
 ]
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
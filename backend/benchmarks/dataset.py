@@ -0,0 +1,153 @@
+"""Synthetic data for the benchmarks, written with bulk inserts.
+
+Every benchmark user is named ``bench-customer-<n>`` or ``bench-staff-<n>``
+and has the password PASSWORD, so ``reset`` can remove them (and, through
+the cascade, their orders) without touching real data. The same ``seed``
+gives the same dataset.
+"""
+import io
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from orders import caching, imaging, rollups
+from orders import search as order_search
+from orders.models import Order, OrderItem, OrderItemImage
+from users import search as user_search
+from users.models import User
+
+PREFIX = "bench-"
+PASSWORD = "bench-Password-123"
+# Distinct pictures; every image row points at one of them
+PICTURES = 8
+
+DETAILS = [
+    "चिसो भएन", "आवाज आउँछ", "पानी चुहिन्छ", "स्क्रिन बल्दैन", "घुम्दैन",
+    "does not start", "makes a noise", "remote not working", "door broken",
+]
+
+
+def customer_name(n):
+    return f"{PREFIX}customer-{n:05d}"
+
+
+def staff_name(n):
+    return f"{PREFIX}staff-{n:03d}"
+
+
+def reset():
+    """Delete every benchmark user with their orders; returns the count."""
+    users = User.objects.filter(username__startswith=PREFIX)
+    user_ids = list(users.values_list("pk", flat=True))
+    users.delete()
+    user_search.reindex(user_ids)
+    return len(user_ids)
+
+
+def _pictures(rng):
+    """Upload PICTURES images and let orders.imaging make their renditions,
+    so the seeded rows share real files: {field: stored name} per picture.
+
+    Also returns the scratch order holding them, to be deleted once other
+    rows refer to the files (or storage.release would remove them).
+    """
+    order = Order.objects.create(customer=User.objects.filter(username__startswith=PREFIX).first())
+    item = OrderItem.objects.create(order=order, order_name=OrderItem.Appliance.OTHER)
+    pictures = []
+    for n in range(PICTURES):
+        buffer = io.BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new("RGB", (1600, 1200), color).save(buffer, "PNG")
+        image = OrderItemImage.objects.create(
+            item=item, image=SimpleUploadedFile(f"bench-{n}.png", buffer.getvalue(), content_type="image/png")
+        )
+        imaging.process_image(image.pk)
+        image.refresh_from_db()
+        pictures.append({"image": image.image.name, "medium": image.medium.name, "thumbnail": image.thumbnail.name})
+    return pictures, order
+
+
+def seed(customers, staff, orders_per_customer, items_per_order, images_per_item, days, batch_size, seed=0):
+    """Create the dataset and return how many rows of each kind were made."""
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)  # hashed once, shared by every user
+    now = timezone.now()
+    appliances = list(OrderItem.Appliance.values)
+    statuses = list(Order.Status.values)
+
+    users = [
+        User(
+            username=customer_name(n), email=f"{customer_name(n)}@example.com", password=password,
+            phone=f"98{rng.randrange(10 ** 8):08d}", address=rng.choice(["काठमाडौं", "ललितपुर", "भक्तपुर", "पोखरा"]),
+        )
+        for n in range(customers)
+    ] + [
+        User(username=staff_name(n), email=f"{staff_name(n)}@example.com", password=password, is_staff=True)
+        for n in range(staff)
+    ]
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+    customer_ids = list(
+        User.objects.filter(username__startswith=f"{PREFIX}customer-").order_by("pk").values_list("pk", flat=True)
+    )
+
+    pictures, scratch = _pictures(rng) if images_per_item else ([], None)
+    counts = {"customers": customers, "staff": staff, "orders": 0, "items": 0, "images": 0}
+
+    # One transaction per batch of customers keeps each write short
+    step = max(1, batch_size // max(1, orders_per_customer))
+    for start in range(0, len(customer_ids), step):
+        chunk = customer_ids[start:start + step]
+        with transaction.atomic():
+            orders = [
+                Order(customer_id=customer_id, status=rng.choice(statuses))
+                for customer_id in chunk
+                for _ in range(orders_per_customer)
+            ]
+            Order.objects.bulk_create(orders, batch_size=batch_size)
+            # created_at is auto_now_add; spread it over the last ``days`` afterwards
+            for order in orders:
+                order.created_at = now - timedelta(days=rng.randrange(days), seconds=rng.randrange(86400))
+            Order.objects.bulk_update(orders, ["created_at"], batch_size=batch_size)
+
+            items = [
+                OrderItem(
+                    order=order,
+                    order_name=rng.choice(appliances),
+                    order_details=rng.choice(DETAILS),
+                    quantity=rng.randint(1, 3),
+                    price=Decimal(rng.randrange(500, 20000, 50)),
+                )
+                for order in orders
+                for _ in range(items_per_order)
+            ]
+            OrderItem.objects.bulk_create(items, batch_size=batch_size)
+
+            images = [
+                OrderItemImage(item=item, state=OrderItemImage.State.READY, **rng.choice(pictures))
+                for item in items
+                for _ in range(images_per_item)
+            ]
+            OrderItemImage.objects.bulk_create(images, batch_size=batch_size)
+
+            # Bulk inserts skip save() and the signals behind totals, rollups
+            # and search; catch up in bulk
+            Order.objects.filter(pk__in=[order.pk for order in orders]).recompute_totals()
+            caching.bump()
+
+        counts["orders"] += len(orders)
+        counts["items"] += len(items)
+        counts["images"] += len(images)
+
+    if scratch is not None:
+        scratch.delete()
+    rollups.rebuild()
+    order_search.rebuild()
+    user_search.rebuild()
+    return counts
@@ -0,0 +1,118 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from functools import partial
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from backend import compression, renderers
+from benchmarks import dataset, runner
+from orders.models import Order
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the API benchmarks against the data from seed_benchmark and report "
+        "p50/p95/p99 latency, throughput and queries per request for each scenario. "
+        "Scenarios create, update and cancel orders: use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenarios", default=",".join(runner.SCENARIOS),
+            help=f"Comma-separated, from: {', '.join(runner.SCENARIOS)}.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8, help="Parallel workers.")
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario first.")
+        parser.add_argument(
+            "--url", help="Benchmark a running server (e.g. http://localhost:8000) instead of this "
+                          "process; queries are then not counted.",
+        )
+        parser.add_argument("--label", default="", help="Free text stored with the results.")
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options["scenarios"].split(",") if name.strip()]
+        unknown = set(scenarios) - set(runner.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}.")
+        if options["concurrency"] < 1 or options["requests"] < 1:
+            raise CommandError("--concurrency and --requests must be at least 1.")
+
+        bench_users = dataset.User.objects.filter(username__startswith=dataset.PREFIX)
+        customers = bench_users.filter(is_staff=False).count()
+        staff = bench_users.filter(is_staff=True).count()
+        if not customers or not staff:
+            raise CommandError("No benchmark users; run seed_benchmark first.")
+
+        if options["url"]:
+            client_factory = partial(runner.HTTPClient, options["url"])
+            hosts = settings.ALLOWED_HOSTS
+        else:
+            if settings.DEBUG:
+                self.stderr.write("DEBUG is on; timings will be slower than in production.")
+            client_factory = runner.InProcessClient
+            hosts = [*settings.ALLOWED_HOSTS, "testserver"]  # the host Django's test client uses
+
+        with override_settings(ALLOWED_HOSTS=hosts):
+            results = runner.run(
+                client_factory, scenarios, options["concurrency"], options["requests"], options["warmup"],
+                customers, staff,
+            )
+
+        report = {
+            "label": options["label"],
+            "commit": _commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "target": options["url"] or "in-process",
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                # JSON library and brotli support shape the order_list* timings and sizes
+                "json": "orjson" if settings.FAST_JSON and renderers.orjson else "json",
+                "brotli": compression.brotli is not None,
+            },
+            "config": {key: options[key] for key in ("concurrency", "requests", "warmup")},
+            "dataset": {
+                "customers": customers,
+                "staff": staff,
+                "orders": Order.objects.filter(customer__username__startswith=dataset.PREFIX).count(),
+            },
+            "scenarios": results,
+        }
+
+        self._print(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+    def _print(self, results):
+        self.stdout.write(
+            f"{'scenario':<20}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'bytes':>9}"
+            f"{'errors':>8}"
+        )
+        for name, result in results.items():
+            latency = result["latency_ms"]
+            queries = result["queries_per_request"]
+            self.stdout.write(
+                f"{name:<20}{result['throughput_rps']:>9}{latency['p50']:>10}{latency['p95']:>10}"
+                f"{latency['p99']:>10}{queries['mean'] if queries else '-':>9}{result['response_bytes']:>9}"
+                f"{result['errors']:>8}"
+            )
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Create benchmark users, orders, items and images with bulk inserts. "
+        "Writes to the configured database: point DB_NAME at a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=200)
+        parser.add_argument("--staff", type=int, default=5)
+        parser.add_argument("--orders-per-customer", type=int, default=10)
+        parser.add_argument("--items-per-order", type=int, default=2)
+        parser.add_argument("--images-per-item", type=int, default=1)
+        parser.add_argument("--days", type=int, default=365, help="Spread order dates over this many past days.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data.")
+        parser.add_argument("--reset", action="store_true", help="Delete earlier benchmark data first.")
+
+    def handle(self, *args, **options):
+        if options["customers"] < 1 or options["staff"] < 1 or options["days"] < 1:
+            raise CommandError("--customers, --staff and --days must be at least 1.")
+
+        if options["reset"]:
+            removed = dataset.reset()
+            self.stdout.write(f"Removed {removed} benchmark user(s) and their orders.")
+        elif dataset.User.objects.filter(username__startswith=dataset.PREFIX).exists():
+            raise CommandError("Benchmark data already exists; use --reset to replace it.")
+
+        counts = dataset.seed(
+            customers=options["customers"],
+            staff=options["staff"],
+            orders_per_customer=options["orders_per_customer"],
+            items_per_order=options["items_per_order"],
+            images_per_item=options["images_per_item"],
+            days=options["days"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+        )
+        summary = ", ".join(f"{value} {name}" for name, value in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary}."))
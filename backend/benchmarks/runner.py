@@ -0,0 +1,277 @@
+"""Drives the API with concurrent requests and summarizes the timings.
+
+Requests go either through Django in this process (``InProcessClient``,
+which also counts the SQL queries of each request) or over HTTP to a running
+server (``HTTPClient``, latency only). Each scenario runs on its own, with
+``concurrency`` workers sharing ``requests`` requests, after a warm-up that
+is not measured.
+
+Workers log in as a benchmark customer (and a benchmark staff member) first;
+see benchmarks.dataset.
+"""
+import json
+import math
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import count
+
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from . import dataset
+
+
+class Response:
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body  # as sent, i.e. still compressed if it was
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class InProcessClient:
+    """Calls the views through Django's request handling in this process."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, token=None, data=None, headers=None):
+        headers = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in (headers or {}).items()}
+        if token:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        body = json.dumps(data) if data is not None else None
+        with ExitStack() as stack:
+            # Every alias, so reads sent to the replica count too
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            response = self.client.generic(method, path, body or "", content_type="application/json", **headers)
+            content = b"".join(response.streaming_content) if response.streaming else response.content
+        return Response(response.status_code, content), sum(len(queries) for queries in captured)
+
+
+class HTTPClient:
+    """Sends real HTTP requests to ``base_url`` (e.g. http://localhost:8000)."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, token=None, data=None, headers=None):
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return Response(response.status, response.read()), None
+        except urllib.error.HTTPError as exc:
+            return Response(exc.code, exc.read()), None
+
+
+class Worker:
+    """One simulated user pair: a customer and a staff member."""
+
+    def __init__(self, client, index, customers, staff):
+        self.client = client
+        self.customer = dataset.customer_name(index % customers)
+        self.staff = dataset.staff_name(index % staff)
+        self.lock = threading.Lock()
+        self.calls = count()
+        self.samples = []
+
+    def measure(self, method, path, token=None, data=None, headers=None):
+        """Make the request the scenario is about, recording (seconds,
+        status, queries, body bytes) in ``samples``."""
+        start = time.perf_counter()
+        response, queries = self.client.request(method, path, token=token, data=data, headers=headers)
+        self.samples.append((time.perf_counter() - start, response.status, queries, len(response.body)))
+        return response
+
+    def login(self, username):
+        response, _ = self.client.request(
+            "POST", "/api/login/", data={"username": username, "password": dataset.PASSWORD}
+        )
+        if response.status != 200:
+            raise RuntimeError(f"Could not log in as {username} ({response.status}); run seed_benchmark first.")
+        return response.json()
+
+    def setup(self):
+        tokens = self.login(self.customer)
+        self.access, self.refresh = tokens["access"], tokens["refresh"]
+        self.staff_access = self.login(self.staff)["access"]
+        response, _ = self.client.request("GET", "/api/orders/?fields=id&page_size=100", token=self.access)
+        self.order_ids = [order["id"] for order in response.json()["results"]]
+        if not self.order_ids:
+            raise RuntimeError(f"{self.customer} has no orders; seed with --orders-per-customer of 1 or more.")
+
+    def next_order(self):
+        return self.order_ids[next(self.calls) % len(self.order_ids)]
+
+
+def _new_order(worker):
+    response, _ = worker.client.request("POST", "/api/orders/", token=worker.access, data={
+        "items_payload": [{"order_name": "TV", "order_details": "benchmark", "quantity": 1}],
+    })
+    return response.json()["id"]
+
+
+# Each scenario times one request with worker.measure; anything else it
+# needs first goes through worker.client untimed.
+
+def login(worker):
+    worker.measure("POST", "/api/login/", data={"username": worker.customer, "password": dataset.PASSWORD})
+
+
+def token_refresh(worker):
+    # Refresh tokens rotate, so the worker keeps the newest one
+    with worker.lock:
+        response = worker.measure("POST", "/api/token/refresh/", data={"refresh": worker.refresh})
+        if response.status == 200:
+            worker.refresh = response.json()["refresh"]
+
+
+def order_list(worker):
+    worker.measure("GET", "/api/orders/", token=worker.access)
+
+
+def order_list_gzip(worker):
+    worker.measure("GET", "/api/orders/", token=worker.access, headers={"Accept-Encoding": "gzip"})
+
+
+def order_list_br(worker):
+    worker.measure("GET", "/api/orders/", token=worker.access, headers={"Accept-Encoding": "br, gzip"})
+
+
+def order_list_compact(worker):
+    worker.measure("GET", "/api/orders/?fields=id,status,total_price,item_count,thumbnail", token=worker.access)
+
+
+def staff_order_list(worker):
+    worker.measure("GET", "/api/orders/?expand=customer", token=worker.staff_access)
+
+
+def order_search(worker):
+    worker.measure("GET", "/api/orders/?q=TV", token=worker.staff_access)
+
+
+def order_detail(worker):
+    worker.measure("GET", f"/api/orders/{worker.next_order()}/", token=worker.access)
+
+
+def order_create(worker):
+    worker.measure("POST", "/api/orders/", token=worker.access, data={
+        "items_payload": [
+            {"order_name": "FRIDGE", "order_details": "benchmark", "quantity": 1},
+            {"order_name": "FAN", "order_details": "benchmark", "quantity": 2},
+        ],
+    })
+
+
+def order_update(worker):
+    worker.measure(
+        "PATCH", f"/api/orders/{worker.next_order()}/", token=worker.staff_access, data={"total_price": "1500.00"}
+    )
+
+
+def order_cancel(worker):
+    order_id = _new_order(worker)
+    worker.measure("POST", f"/api/orders/{order_id}/cancel/", token=worker.access)
+
+
+def reports(worker):
+    worker.measure("GET", "/api/orders/reports/", token=worker.staff_access)
+
+
+def customer_list(worker):
+    worker.measure("GET", "/api/users/customers/?stats=true", token=worker.staff_access)
+
+
+SCENARIOS = {
+    "login": login,
+    "token_refresh": token_refresh,
+    "order_list": order_list,
+    "order_list_gzip": order_list_gzip,
+    "order_list_br": order_list_br,
+    "order_list_compact": order_list_compact,
+    "staff_order_list": staff_order_list,
+    "order_search": order_search,
+    "order_detail": order_detail,
+    "order_create": order_create,
+    "order_update": order_update,
+    "order_cancel": order_cancel,
+    "reports": reports,
+    "customer_list": customer_list,
+}
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _, _, _ in samples)
+    errors = sum(1 for _, status, _, _ in samples if status >= 400)
+    queries = [n for _, _, n, _ in samples if n is not None]
+    sizes = [size for _, _, _, size in samples]
+
+    def ms(seconds):
+        return round(seconds * 1000, 2) if seconds is not None else None
+
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(statistics.fmean(latencies)) if latencies else None,
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+        "queries_per_request": {
+            "mean": round(statistics.fmean(queries), 2),
+            "max": max(queries),
+        } if queries else None,
+        "response_bytes": round(statistics.fmean(sizes)) if sizes else None,
+    }
+
+
+def run_scenario(scenario, workers, requests, warmup):
+    """Run ``scenario`` ``requests`` times spread over the workers (one
+    thread each) and return its summary."""
+    def drive(worker, n):
+        try:
+            worker.samples = []
+            for _ in range(n):
+                scenario(worker)
+            return worker.samples
+        finally:
+            connections.close_all()  # this thread's connections
+
+    def share(total, i):
+        return total // len(workers) + (1 if i < total % len(workers) else 0)
+
+    with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+        list(pool.map(lambda i: drive(workers[i], share(warmup, i)), range(len(workers))))
+        started = time.perf_counter()
+        results = list(pool.map(lambda i: drive(workers[i], share(requests, i)), range(len(workers))))
+        elapsed = time.perf_counter() - started
+
+    return summarize([sample for samples in results for sample in samples], elapsed)
+
+
+def run(client_factory, scenarios, concurrency, requests, warmup, customers, staff):
+    """Run each named scenario in turn; returns {name: summary}."""
+    workers = [Worker(client_factory(), i, customers, staff) for i in range(concurrency)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda worker: worker.setup(), workers))
+    return {name: run_scenario(SCENARIOS[name], workers, requests, warmup) for name in scenarios}
@@ -0,0 +1,89 @@
+"""Set-based bulk changes to orders, for staff.
+
+All operations are checked against the current rows in one locked SELECT,
+then applied with one UPDATE per distinct (status, total_price) change,
+however many orders share it.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from backend import metrics
+
+from . import caching, events, rollups
+from .models import Order
+
+# Same rules as OrderViewSet.destroy and cancel: these orders are final
+FINAL_STATUSES = (Order.Status.COMPLETED, Order.Status.REJECTED)
+
+UNSET = object()
+
+
+def _check(operation, order, seen):
+    if order is None:
+        return "अर्डर फेला परेन।"
+    if order.pk in seen:
+        return "एउटै अर्डर दोहोरियो।"
+    if order.status in FINAL_STATUSES:
+        return "पूरा वा अस्वीकृत अर्डर परिवर्तन गर्न मिल्दैन।"
+    if operation.get("action") == "cancel" and order.status == Order.Status.CANCELLED:
+        return "अर्डर पहिले नै रद्द गरिएको छ।"
+    return None
+
+
+@transaction.atomic
+def apply(operations):
+    """Apply validated BulkOrderOperationSerializer data; return one result
+    per operation, in order."""
+    ids = {operation["id"] for operation in operations}
+    orders = {
+        order.pk: order
+        for order in Order.objects.select_for_update()
+        .filter(pk__in=ids)
+        .only("id", "status", "total_price", "customer_id", "created_at")
+    }
+
+    results = []
+    groups = defaultdict(list)  # (status, total_price) -> order ids
+    seen = set()
+    for operation in operations:
+        order = orders.get(operation["id"])
+        error = _check(operation, order, seen)
+        if error:
+            results.append({"id": operation["id"], "ok": False, "detail": error})
+            continue
+        seen.add(order.pk)
+
+        new_status = Order.Status.CANCELLED if operation.get("action") == "cancel" else operation.get("status", UNSET)
+        new_price = operation.get("total_price", UNSET)
+        groups[(new_status, new_price)].append(order.pk)
+        if new_status is not UNSET:
+            metrics.order_transition(order.status, new_status)
+            order.status = new_status
+        if new_price is not UNSET:
+            order.total_price = new_price
+        results.append({
+            "id": order.pk,
+            "ok": True,
+            "status": order.status,
+            "total_price": None if order.total_price is None else str(order.total_price),
+        })
+
+    now = timezone.now()
+    for (new_status, new_price), order_ids in groups.items():
+        changes = {"updated_at": now, "version": F("version") + 1}
+        if new_status is not UNSET:
+            changes["status"] = new_status
+        if new_price is not UNSET:
+            changes["total_price"] = new_price
+        # The status guard repeats the check above inside the UPDATE itself
+        Order.objects.filter(pk__in=order_ids).exclude(status__in=FINAL_STATUSES).update(**changes)
+
+    changed = [orders[result["id"]] for result in results if result["ok"]]
+    rollups.schedule_refresh(*{rollups.day_of(order.created_at) for order in changed})
+    caching.bump(*{order.customer_id for order in changed})
+    for order in changed:
+        events.touched(order.pk, order.customer_id)
+    return results
@@ -0,0 +1,114 @@
+"""Version stamps and response caching for the order endpoints.
+
+Each customer has a version number in the cache, and there is one more for
+"all orders" (what staff see). Any change to an order bumps its customer's
+version and the global one once the transaction commits. ETags and cached
+responses are keyed by the version (and the signing window of the image URLs
+in them, see orders.media), so a bump invalidates them at once and an
+unchanged list costs no queries and no serialization.
+
+The version keys must live in a cache shared by all worker processes (see
+CACHES in settings) for the validators to be correct across processes.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+
+from . import media
+
+ALL = "all"
+
+
+def _version_key(scope):
+    return f"orders:version:{scope}"
+
+
+def _get_version(scope):
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version that fell out of the cache never
+        # comes back with a number that was already handed out
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def _aget_version(scope):
+    key = _version_key(scope)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump(*customer_ids):
+    """Invalidate cached order data of these customers (and the staff view)
+    after the current transaction commits."""
+    scopes = {ALL, *(customer_id for customer_id in customer_ids if customer_id is not None)}
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _scope(user):
+    return ALL if user.is_staff else user.pk
+
+
+def _etag(request, version):
+    renderer = getattr(request, "accepted_renderer", None)
+    raw = ":".join([
+        str(request.user.pk),
+        str(version),
+        renderer.format if renderer else "",
+        request.get_full_path(),
+        # Responses carry signed image URLs; renew them before they expire
+        str(media.url_expiry()),
+    ])
+    return '"%s"' % hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def etag_for(request):
+    return _etag(request, _get_version(_scope(request.user)))
+
+
+async def aetag_for(request):
+    return _etag(request, await _aget_version(_scope(request.user)))
+
+
+def is_current(request, etag):
+    """Whether If-None-Match names ``etag``. Weak comparison: compressed
+    responses carry it as W/"..." (see backend/compression.py)."""
+    return etag in {tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))}
+
+
+def _response_key(etag):
+    return f"orders:response:{etag}"
+
+
+def get_response_data(etag):
+    return cache.get(_response_key(etag))
+
+
+def set_response_data(etag, data):
+    cache.set(_response_key(etag), data, settings.ORDER_RESPONSE_CACHE_TIMEOUT)
+
+
+async def aget_response_data(etag):
+    return await cache.aget(_response_key(etag))
+
+
+async def aset_response_data(etag, data):
+    await cache.aset(_response_key(etag), data, settings.ORDER_RESPONSE_CACHE_TIMEOUT)
@@ -0,0 +1,306 @@
+"""Order change events for the server-sent event stream (/api/orders/events/).
+
+Whenever an order, its items or its totals change, a compact event goes out
+once the transaction commits:
+
+    event: order
+    data: {"id":12,"status":"COMPLETED","total_price":"1500.00","updated_at":"...","version":4,"customer":3}
+
+and ``event: order_deleted`` with the id and customer when it is deleted.
+
+EventSource can't send an Authorization header, and an access token in the
+URL would end up in proxy and access logs. Clients therefore POST to
+/api/orders/events/ticket/ for a ticket and open the stream with
+``?ticket=``. A ticket only opens event streams, expires after
+ORDER_EVENTS_TICKET_SECONDS and works once.
+
+Subscribers are async generators in the ASGI event loop; customers get the
+events of their own orders, staff get all of them.
+
+ORDER_EVENTS_BACKEND picks the broker:
+- ``orders.events.LocalBroker`` (default) delivers within one process.
+- ``orders.events.CacheBroker`` also relays events through the shared cache
+  (see CACHES in settings), for deployments with several worker processes.
+"""
+import asyncio
+import logging
+import math
+import secrets
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CHANGED = "order"
+DELETED = "order_deleted"
+TICKET_SALT = "orders.events.ticket"
+
+_pending = threading.local()
+
+
+def encode(kind, event):
+    """One SSE message."""
+    data = DjangoJSONEncoder(separators=(",", ":")).encode(event)
+    return f"event: {kind}\ndata: {data}\n\n"
+
+
+class Subscription:
+    def __init__(self, broker, user):
+        self.broker = broker
+        self.user_id = user.pk
+        self.is_staff = user.is_staff
+        self.loop = asyncio.get_running_loop()
+        # Slow clients drop events rather than grow without bound
+        self.queue = asyncio.Queue(maxsize=settings.ORDER_EVENTS_QUEUE_SIZE)
+
+    def wants(self, event):
+        return self.is_staff or event["customer"] == self.user_id
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    def deliver(self, message):
+        # Called from whatever thread published the event
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Fans events out to the subscribers of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+
+    def subscribe(self, user):
+        subscription = Subscription(self, user)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def has_listeners(self):
+        return bool(self.subscriptions)
+
+    def publish(self, kind, event):
+        self.fan_out(kind, event)
+
+    def fan_out(self, kind, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        message = None
+        for subscription in subscriptions:
+            if subscription.wants(event):
+                message = message or encode(kind, event)
+                subscription.deliver(message)
+
+
+class CacheBroker(LocalBroker):
+    """LocalBroker that also hands events to the other worker processes.
+
+    Events are appended to a numbered log in the shared cache. Each process
+    with subscribers polls the log every ORDER_EVENTS_POLL_SECONDS and fans
+    out what the other processes published.
+
+    Publishing takes the number first and stores the entry second, so a poll
+    may see a number whose entry isn't there yet. Such numbers stay pending
+    and are fetched again on every poll until they turn up or
+    ORDER_EVENTS_RETENTION_SECONDS pass (the publisher died in between). A
+    late entry therefore arrives after later ones; events carry the order's
+    version, so clients can tell an older state from a newer one.
+
+    A process with subscribers also keeps LISTENERS_KEY alive for a few poll
+    intervals at a time, so that with no subscriber anywhere publishing is
+    skipped without reading the orders.
+    """
+
+    SEQUENCE_KEY = "orders:events:seq"
+    LISTENERS_KEY = "orders:events:listeners"
+
+    def __init__(self):
+        super().__init__()
+        self.origin = f"{id(self)}-{time.time_ns()}"
+        self.poller = None
+
+    @staticmethod
+    def _entry_key(seq):
+        return f"orders:events:entry:{seq}"
+
+    def subscribe(self, user):
+        subscription = super().subscribe(user)
+        self._listening()
+        with self.lock:
+            if self.poller is None:
+                self.poller = threading.Thread(target=self._poll, name="order-events", daemon=True)
+                self.poller.start()
+        return subscription
+
+    def _listening(self):
+        # Outlives a few missed polls, but not a process that died
+        timeout = max(1, math.ceil(5 * settings.ORDER_EVENTS_POLL_SECONDS))
+        cache.set(self.LISTENERS_KEY, True, timeout)
+
+    def has_listeners(self):
+        return super().has_listeners() or bool(cache.get(self.LISTENERS_KEY))
+
+    def publish(self, kind, event):
+        super().publish(kind, event)
+        try:
+            seq = cache.incr(self.SEQUENCE_KEY)
+        except ValueError:
+            cache.add(self.SEQUENCE_KEY, 0, timeout=None)
+            seq = cache.incr(self.SEQUENCE_KEY)
+        cache.set(self._entry_key(seq), (self.origin, kind, event), settings.ORDER_EVENTS_RETENTION_SECONDS)
+
+    def _poll(self):
+        seen = cache.get(self.SEQUENCE_KEY) or 0
+        missing = {}  # seq: when to give up on it
+        while True:
+            time.sleep(settings.ORDER_EVENTS_POLL_SECONDS)
+            try:
+                seen = self._poll_once(seen, missing)
+            except Exception:
+                logger.exception("Polling order events failed")
+
+    def _poll_once(self, seen, missing):
+        """Fan out the entries after ``seen`` and those still ``missing``;
+        returns the new ``seen``."""
+        if self.subscriptions:
+            self._listening()
+        latest = cache.get(self.SEQUENCE_KEY) or 0
+        if latest < seen:
+            seen = latest  # the cache was flushed
+            missing.clear()
+        numbers = sorted(missing) + list(range(seen + 1, latest + 1))
+        if not numbers:
+            return seen
+        entries = cache.get_many([self._entry_key(n) for n in numbers])
+        now = time.monotonic()
+        for n in numbers:
+            entry = entries.get(self._entry_key(n))
+            if entry is None:
+                # Numbered but not stored yet; drop it once it would have expired
+                if missing.setdefault(n, now + settings.ORDER_EVENTS_RETENTION_SECONDS) <= now:
+                    del missing[n]
+                continue
+            missing.pop(n, None)
+            if entry[0] != self.origin:
+                self.fan_out(entry[1], entry[2])
+        return latest
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.ORDER_EVENTS_BACKEND)()
+    return _broker
+
+
+class _Publish:
+    """on_commit callback collecting the orders touched by one transaction."""
+
+    def __init__(self):
+        self.orders = {}
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        try:
+            publish_orders(self.orders)
+        except Exception:
+            logger.exception("Publishing order events failed")
+
+
+def touched(order_id, customer_id):
+    """Publish the state of this order once the current transaction commits.
+
+    The row is read after the commit, so an order saved several times in one
+    transaction (items, then totals) produces one event with its final state.
+    Same weak-reference bookkeeping as rollups.schedule_refresh.
+    """
+    ref = getattr(_pending, "callback", None)
+    callback = ref() if ref is not None else None
+    if callback is None or callback.done:
+        callback = _Publish()
+        callback.orders[order_id] = customer_id
+        _pending.callback = weakref.ref(callback)
+        transaction.on_commit(callback)
+    else:
+        callback.orders[order_id] = customer_id
+
+
+def publish_orders(orders):
+    """Publish the current state of ``orders`` ({id: customer_id})."""
+    broker = get_broker()
+    if not broker.has_listeners():
+        return
+    from .models import Order
+
+    rows = Order.objects.filter(pk__in=orders).values(
+        "id", "status", "total_price", "updated_at", "version", "customer_id"
+    )
+    found = set()
+    for row in rows:
+        found.add(row["id"])
+        row["customer"] = row.pop("customer_id")
+        broker.publish(CHANGED, row)
+    for order_id in orders.keys() - found:
+        broker.publish(DELETED, {"id": order_id, "customer": orders[order_id]})
+
+
+def issue_ticket(user):
+    return signing.TimestampSigner(salt=TICKET_SALT).sign(f"{user.pk}:{secrets.token_urlsafe(12)}")
+
+
+async def aredeem_ticket(ticket):
+    """The active user a valid ticket was issued to, or None; marks it used."""
+    try:
+        value = signing.TimestampSigner(salt=TICKET_SALT).unsign(
+            ticket, max_age=settings.ORDER_EVENTS_TICKET_SECONDS
+        )
+    except signing.BadSignature:
+        return None
+    if not await cache.aadd(f"orders:events:ticket:{value}", True, settings.ORDER_EVENTS_TICKET_SECONDS):
+        return None  # used before
+    user_id = value.partition(":")[0]
+    return await get_user_model().objects.filter(pk=user_id, is_active=True).afirst()
+
+
+async def stream(subscription):
+    """SSE body for one client: events as they come, plus a comment line
+    every ORDER_EVENTS_HEARTBEAT_SECONDS so proxies keep the connection."""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                yield await subscription.get(settings.ORDER_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        subscription.close()
@@ -0,0 +1,91 @@
+from datetime import datetime, time
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from backend import search
+
+from .models import Order, OrderItem
+
+
+class OrderFilterBackend(BaseFilterBackend):
+    """Server-side filters for the order list.
+
+    ?status=PENDING,COMPLETED   one or more statuses
+    ?customer=<id>              staff only; customers only ever see their own
+    ?created_after=<date|datetime>&created_before=<date|datetime>
+    ?order_name=FRIDGE          orders with at least one item of that appliance
+    ?q=<words>                  full-text search (backend/search.py), best matches first
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        statuses = self._split(params.get("status"))
+        if statuses:
+            invalid = set(statuses) - set(Order.Status.values)
+            if invalid:
+                raise ValidationError({"status": f"अमान्य स्थिति: {', '.join(sorted(invalid))}"})
+            queryset = queryset.filter(status__in=statuses)
+
+        customer = params.get("customer")
+        if customer:
+            if not customer.isdigit():
+                raise ValidationError({"customer": "अमान्य ग्राहक।"})
+            queryset = queryset.filter(customer_id=int(customer))
+
+        created_after = params.get("created_after")
+        if created_after:
+            queryset = queryset.filter(created_at__gte=self._parse_moment(created_after, "created_after"))
+
+        created_before = params.get("created_before")
+        if created_before:
+            moment = self._parse_moment(created_before, "created_before", end_of_day=True)
+            queryset = queryset.filter(created_at__lte=moment)
+
+        order_names = self._split(params.get("order_name"))
+        if order_names:
+            invalid = set(order_names) - set(OrderItem.Appliance.values)
+            if invalid:
+                raise ValidationError({"order_name": f"अमान्य उपकरण: {', '.join(sorted(invalid))}"})
+            # EXISTS instead of a join so an order never shows up twice
+            items = OrderItem.objects.filter(order=OuterRef("pk"), order_name__in=order_names)
+            queryset = queryset.filter(Exists(items))
+
+        q = params.get("q")
+        if search.has_terms(q):
+            queryset = queryset.filter(search__body__match=q).annotate(search_rank=search.Rank("search__body", q))
+
+        return queryset
+
+    def get_ordering(self, request, queryset, view):
+        """Used by KeysetPagination: search results go by relevance."""
+        if search.has_terms(request.query_params.get("q")):
+            return ("search_rank", "-id")
+        return None
+
+    @staticmethod
+    def _split(value):
+        if not value:
+            return []
+        return [part.strip() for part in value.split(",") if part.strip()]
+
+    @staticmethod
+    def _parse_moment(value, param, end_of_day=False):
+        """Accept either a full datetime or a bare date (whole day inclusive)."""
+        try:
+            day = parse_date(value)
+            if day is not None:
+                moment = datetime.combine(day, time.max if end_of_day else time.min)
+            else:
+                moment = parse_datetime(value)
+                if moment is None:
+                    raise ValueError
+        except ValueError:
+            raise ValidationError({param: "अमान्य मिति।"})
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
@@ -0,0 +1,107 @@
+"""Off-request processing of uploaded item photos.
+
+Uploads are stored as-is during the request and queued here once the
+transaction commits. A background worker then:
+- downscales and re-encodes the original,
+- writes medium and thumbnail renditions,
+- drops EXIF and other metadata (after applying the EXIF orientation),
+- marks the image READY, or FAILED if the file can't be decoded.
+"""
+import io
+import logging
+import os
+from functools import partial
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from backend import tasks
+
+from . import caching, storage
+from .models import OrderItemImage
+
+logger = logging.getLogger(__name__)
+
+# Longest edge, in pixels, of each stored version
+RENDITIONS = {
+    "image": 2048,
+    "medium": 1024,
+    "thumbnail": 256,
+}
+JPEG_QUALITY = 85
+
+
+def schedule(image_ids):
+    """Queue the given OrderItemImage ids once the current transaction commits."""
+    for image_id in image_ids:
+        transaction.on_commit(partial(tasks.enqueue, process_image, image_id))
+
+
+def _encode(picture, longest_edge):
+    rendition = picture.copy()
+    rendition.thumbnail((longest_edge, longest_edge), Image.LANCZOS)
+    buffer = io.BytesIO()
+    # No exif/icc arguments: the re-encoded file carries no metadata
+    rendition.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _load(field):
+    with field.open("rb") as f:
+        picture = Image.open(f)
+        # Let the JPEG decoder scale down while decoding; no-op for other formats
+        longest_edge = max(RENDITIONS.values())
+        picture.draft("RGB", (longest_edge, longest_edge))
+        picture = ImageOps.exif_transpose(picture)
+        if picture.mode in ("RGBA", "LA", "P"):
+            picture = picture.convert("RGBA")
+            background = Image.new("RGB", picture.size, "white")
+            background.paste(picture, mask=picture.getchannel("A"))
+            return background
+        return picture.convert("RGB")
+
+
+def process_image(image_id):
+    try:
+        image = OrderItemImage.objects.select_related("item__order").get(pk=image_id)
+    except OrderItemImage.DoesNotExist:
+        return  # deleted before we got to it
+
+    if image.state == OrderItemImage.State.READY:
+        return
+
+    try:
+        picture = _load(image.image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+        logger.warning("Could not decode order item image %s", image_id, exc_info=True)
+        OrderItemImage.objects.filter(pk=image_id).update(state=OrderItemImage.State.FAILED)
+        return
+
+    original = image.image.name
+    stem = os.path.splitext(os.path.basename(original))[0]
+    names = {}
+    for field_name, longest_edge in RENDITIONS.items():
+        field = getattr(image, field_name)
+        content = ContentFile(_encode(picture, longest_edge))
+        names[field_name] = field.storage.save(field.field.generate_filename(image, f"{stem}.jpg"), content)
+
+    updated = OrderItemImage.objects.filter(pk=image_id, image=original).update(
+        state=OrderItemImage.State.READY, **names
+    )
+    if updated:
+        caching.bump(image.item.order.customer_id)
+        storage.release(original)
+    else:
+        # The image was removed or replaced meanwhile; drop what we wrote
+        storage.release(*names.values())
+
+
+def process_pending():
+    """Process every image still waiting, e.g. after a restart lost the queue."""
+    count = 0
+    pending = OrderItemImage.objects.filter(state=OrderItemImage.State.PENDING).values_list("pk", flat=True)
+    for image_id in pending.iterator():
+        process_image(image_id)
+        count += 1
+    return count
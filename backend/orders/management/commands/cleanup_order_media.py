@@ -0,0 +1,59 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from orders.models import OrderItemImage
+from orders.storage import order_media_storage
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete files under order_item_images/ that no OrderItemImage refers to, "
+        "including files orphaned before content-addressed storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only list what would be deleted.")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        deleted = 0
+        for batch in self._batches(self._walk("order_item_images")):
+            referenced = set()
+            for field in ("image", "thumbnail", "medium"):
+                referenced.update(
+                    OrderItemImage.objects.filter(**{f"{field}__in": batch}).values_list(field, flat=True)
+                )
+            for name in batch:
+                if name in referenced or order_media_storage.is_recent(name):
+                    continue
+                if dry_run:
+                    self.stdout.write(name)
+                else:
+                    order_media_storage.delete(name)
+                deleted += 1
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} file(s)."))
+
+    def _walk(self, directory):
+        root = order_media_storage.path(directory)
+        for dirpath, dirnames, filenames in os.walk(root):
+            relative = os.path.relpath(dirpath, order_media_storage.location)
+            for filename in filenames:
+                # Interrupted uploads leave .upload-* temporaries; they are
+                # unreferenced too and go once past the grace period
+                yield os.path.join(relative, filename).replace(os.sep, "/")
+
+    @staticmethod
+    def _batches(names):
+        batch = []
+        for name in names:
+            batch.append(name)
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders import imaging
+
+
+class Command(BaseCommand):
+    help = "Process order item images that are still waiting for their renditions."
+
+    def handle(self, *args, **options):
+        count = imaging.process_pending()
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} image(s)."))
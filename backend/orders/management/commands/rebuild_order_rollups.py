@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the OrderDailyStat rollup table from the orders table."
+
+    def handle(self, *args, **options):
+        days = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {days} day(s)."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from orders import search as order_search
+from users import search as user_search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search indexes of orders and customers from scratch."
+
+    def handle(self, *args, **options):
+        orders = order_search.rebuild()
+        users = user_search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {orders} order(s) and {users} user(s)."))
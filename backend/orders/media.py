@@ -0,0 +1,173 @@
+"""Protected delivery of order images at MEDIA_URL.
+
+Image URLs in API responses are signed: ``/media/<name>?e=<expires>&s=<sig>``
+(see MediaURLField). A valid, unexpired signature is all this view needs,
+so an <img> tag loads the file with neither a token nor a database query.
+Without one, a JWT or session user who is staff or owns an order using the
+file may still read it.
+
+All URLs signed within one ORDER_MEDIA_URL_TTL window share their expiry,
+which lies one to two windows ahead. The URL of an image therefore stays
+the same from response to response, and with ``Cache-Control: immutable``
+the browser loads it once. The order ETags and cached responses change with
+the window (orders.caching), so clients never hold an expired URL.
+
+The file itself is sent by the front proxy when ORDER_MEDIA_DELIVERY is
+``x-accel-redirect`` (nginx: an ``internal`` location at
+ORDER_MEDIA_ACCEL_PREFIX aliasing MEDIA_ROOT) or ``x-sendfile`` (Apache,
+lighttpd). Otherwise a FileResponse streams it, through the server's
+sendfile() support where there is one. ETags come from the content hash in
+the file name, and single byte ranges are honoured.
+"""
+import mimetypes
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.encoding import filepath_to_uri
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.authentication import CachedJWTAuthentication
+
+from .storage import order_media_storage
+
+SALT = "orders.media"
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def url_expiry(now=None):
+    """The expiry of URLs signed now: the end of the window after this one."""
+    ttl = settings.ORDER_MEDIA_URL_TTL
+    return (int(now if now is not None else time.time()) // ttl + 2) * ttl
+
+
+def signature(name, expires):
+    return salted_hmac(SALT, f"{name}:{expires}", algorithm="sha256").hexdigest()[:32]
+
+
+def signed_query(name, expires):
+    return f"?e={expires}&s={signature(name, expires)}"
+
+
+def _valid_signature(name, expires, sig):
+    try:
+        expires = int(expires)
+    except ValueError:
+        return False
+    return expires >= time.time() and constant_time_compare(sig, signature(name, expires))
+
+
+def _may_read(request, name):
+    expires, sig = request.GET.get("e"), request.GET.get("s")
+    if expires and sig and _valid_signature(name, expires, sig):
+        return True
+
+    user = request.user if request.user.is_authenticated else None  # admin session
+    if user is None:
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        if result is None:
+            return False
+        user = result[0]
+    if user.is_staff:
+        return True
+
+    from .models import OrderItemImage
+
+    return OrderItemImage.objects.filter(
+        Q(image=name) | Q(thumbnail=name) | Q(medium=name), item__order__customer=user
+    ).exists()
+
+
+def _etag(name, stat):
+    # Stored names are the SHA-256 of the content; older uploads kept theirs
+    digest = os.path.splitext(os.path.basename(name))[0]
+    if DIGEST_RE.match(digest):
+        return f'"{digest}"'
+    return f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def _byte_range(request, size, etag):
+    """(first, last) of a satisfiable single range, None for the whole file,
+    or False when the range lies beyond it."""
+    header = request.headers.get("Range")
+    if not header or size == 0:
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != etag:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None  # malformed or several ranges: the whole file is fine
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        first, last = max(0, size - int(last)), size - 1  # the final N bytes
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first >= size:
+        return False
+    if first > last:
+        return None
+    return first, last
+
+
+@require_safe
+def serve(request, name):
+    if not _may_read(request, name):
+        return HttpResponseForbidden()
+    try:
+        path = order_media_storage.path(name)
+        stat = os.stat(path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+
+    etag = _etag(name, stat)
+    headers = {
+        "ETag": etag,
+        # Private: access depends on the user or the signature
+        "Cache-Control": f"private, max-age={settings.ORDER_MEDIA_MAX_AGE}, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if etag in {tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match", ""))}:
+        return HttpResponseNotModified(headers=headers)
+
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    delivery = settings.ORDER_MEDIA_DELIVERY
+    if delivery == "x-accel-redirect":
+        # nginx serves the file, ranges included, and keeps these headers
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response["X-Accel-Redirect"] = settings.ORDER_MEDIA_ACCEL_PREFIX + filepath_to_uri(name)
+        return response
+    if delivery == "x-sendfile":
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response["X-Sendfile"] = path
+        return response
+
+    byte_range = _byte_range(request, stat.st_size, etag)
+    if byte_range is False:
+        response = HttpResponse(status=416, headers=headers)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+    if byte_range is not None:
+        first, last = byte_range
+        with open(path, "rb") as f:
+            f.seek(first)
+            content = f.read(last - first + 1)
+        response = HttpResponse(content, status=206, content_type=content_type, headers=headers)
+        response["Content-Range"] = f"bytes {first}-{last}/{stat.st_size}"
+        return response
+    return FileResponse(open(path, "rb"), content_type=content_type, headers=headers)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('PENDING', 'प्रक्रियामा'), ('COMPLETED', 'पूरा भएको'), ('REJECTED', 'अस्वीकृत'), ('CANCELLED', 'रद्द गरिएको')], max_length=20)),
+                ('appliance', models.CharField(blank=True, choices=[('FRIDGE', 'फ्रिज'), ('WASHING_MACHINE', 'वाशिङ मेसिन'), ('OVEN', 'अभन'), ('TV', 'टेलिभिजन'), ('FAN', 'पंखा'), ('OTHER', 'अन्य')], max_length=50)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'status', 'appliance'), name='order_daily_stat_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_daily_stat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitemimage',
+            name='medium',
+            field=models.ImageField(blank=True, upload_to='order_item_images/medium/'),
+        ),
+        migrations.AddField(
+            model_name='orderitemimage',
+            name='state',
+            field=models.CharField(choices=[('PENDING', 'प्रक्रियामा'), ('READY', 'तयार'), ('FAILED', 'असफल')], default='PENDING', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='orderitemimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='order_item_images/thumbnails/'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:27
+
+import orders.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_item_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitemimage',
+            name='image',
+            field=models.ImageField(db_index=True, max_length=255, storage=orders.storage.ContentAddressedStorage(), upload_to='order_item_images/'),
+        ),
+        migrations.AlterField(
+            model_name='orderitemimage',
+            name='medium',
+            field=models.ImageField(blank=True, db_index=True, max_length=255, storage=orders.storage.ContentAddressedStorage(), upload_to='order_item_images/medium/'),
+        ),
+        migrations.AlterField(
+            model_name='orderitemimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, db_index=True, max_length=255, storage=orders.storage.ContentAddressedStorage(), upload_to='order_item_images/thumbnails/'),
+        ),
+    ]
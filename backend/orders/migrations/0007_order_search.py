@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:43
+
+import backend.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_index(apps, schema_editor):
+    backend.search.create_table(schema_editor, "orders_order_fts", "orders_order")
+
+
+def drop_index(apps, schema_editor):
+    backend.search.drop_table(schema_editor, "orders_order_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSearch',
+            fields=[
+                ('order', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='orders.order')),
+                ('body', backend.search.SearchTextField()),
+            ],
+            options={
+                'db_table': 'orders_order_fts',
+                'managed': False,
+            },
+        ),
+        # Fill it with manage.py rebuild_search_index
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,7 +1,85 @@
 from django.db import models
+from django.db.models.functions import Coalesce, NullIf
+from django.db.models.signals import post_save
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
 
+from backend.search import SearchTextField
+
+from .storage import order_media_storage
+
+MONEY = models.DecimalField(max_digits=10, decimal_places=2)
+
+
+def items_prefetch():
+    """Prefetch of Order.items (and their images) with only the serialized columns."""
+    images = OrderItemImage.objects.only("id", "item_id", "image", "thumbnail", "medium", "state").order_by("id")
+    items = (
+        OrderItem.objects
+        .only("id", "order_id", "order_name", "order_details", "quantity", "price")
+        .order_by("id")
+        .prefetch_related(models.Prefetch("images", queryset=images))
+    )
+    return models.Prefetch("items", queryset=items)
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_item_count(self):
+        """Annotate ``item_count`` without loading the items."""
+        counts = (
+            OrderItem.objects
+            .filter(order=models.OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(n=models.Count("id"))
+            .values("n")
+        )
+        return self.annotate(
+            item_count=Coalesce(models.Subquery(counts, output_field=models.IntegerField()), models.Value(0))
+        )
+
+    def with_thumbnail(self):
+        """Annotate ``thumbnail_name``: the stored name of the order's first
+        image, as its thumbnail once orders.imaging has made one."""
+        first = (
+            OrderItemImage.objects
+            .filter(item__order=models.OuterRef("pk"))
+            .order_by("item_id", "id")
+            .annotate(name=Coalesce(NullIf("thumbnail", models.Value("")), "image", output_field=models.CharField()))
+            .values("name")[:1]
+        )
+        return self.annotate(thumbnail_name=models.Subquery(first, output_field=models.CharField()))
+
+    def recompute_totals(self):
+        """Set total_price of every order in the queryset to the sum of its
+        items with one UPDATE ... SET total_price = (SELECT SUM(...)).
+
+        Like any queryset update this skips save() and its signals; callers
+        refresh the report rollups themselves.
+        """
+        line_totals = (
+            OrderItem.objects
+            .filter(order=models.OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total=models.Sum(models.F("price") * models.F("quantity"), output_field=MONEY))
+            .values("total")
+        )
+        return self.update(
+            total_price=Coalesce(models.Subquery(line_totals, output_field=MONEY), models.Value(Decimal("0.00"))),
+            updated_at=timezone.now(),
+            version=models.F("version") + 1,
+        )
+
+
+class OrderConflict(Exception):
+    """The order changed after the version a write was based on was read."""
+
+    def __init__(self, order_id):
+        super().__init__(f"Order {order_id} has changed")
+        self.order_id = order_id
+
 
 class Order(models.Model):
     class Status(models.TextChoices):
@@ -15,14 +93,69 @@ class Order(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped by every write; see compare_and_set
+    version = models.PositiveIntegerField(default=1)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (created_at, id) after these filters
+            models.Index(fields=["customer", "status", "created_at"], name="order_customer_status_idx"),
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+            models.Index(fields=["created_at", "id"], name="order_created_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored status, so orders.signals can count status changes
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        # Bump in SQL, so the new version differs from any a concurrent
+        # compare_and_set wrote
+        self.version = models.F("version") + 1
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=["version"])
+
+    def compare_and_set(self, expected_version, **changes):
+        """Write ``changes`` with one UPDATE ... WHERE version = expected_version,
+        bumping the version; raise OrderConflict if the order has been
+        changed (or deleted) since that version was read.
+
+        The UPDATE is the check, so there is no lock to wait for. Receivers
+        of post_save (caching, events, rollups, metrics) run as after save().
+        """
+        now = timezone.now()
+        written = Order.objects.filter(pk=self.pk, version=expected_version).update(
+            version=models.F("version") + 1, updated_at=now, **changes
+        )
+        if not written:
+            raise OrderConflict(self.pk)
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.version = expected_version + 1
+        self.updated_at = now
+        post_save.send(
+            sender=Order, instance=self, created=False, raw=False, using=self._state.db,
+            update_fields=frozenset([*changes, "version", "updated_at"]),
+        )
 
     # Do NOT block save here; enforce immutability in the view/serializer
     def update_total_price(self):
-        total = Decimal("0.00")
-        for item in self.items.all():
-            total += item.total_price
-        self.total_price = total
-        super().save(update_fields=["total_price", "updated_at"])
+        from . import caching, events, rollups
+
+        Order.objects.filter(pk=self.pk).recompute_totals()
+        self.refresh_from_db(fields=["total_price", "updated_at", "version"])
+        rollups.schedule_refresh(rollups.day_of(self.created_at))
+        caching.bump(self.customer_id)
+        events.touched(self.pk, self.customer_id)
 
     def __str__(self):
         return f"Order {self.id} by {self.customer}"
@@ -50,15 +183,59 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.order_name} - {self.order.id}"
 
-    def delete(self, *args, **kwargs):
-        order = self.order
-        super().delete(*args, **kwargs)
-        order.update_total_price()
-
 
 class OrderItemImage(models.Model):
+    class State(models.TextChoices):
+        PENDING = 'PENDING', 'प्रक्रियामा'
+        READY = 'READY', 'तयार'
+        FAILED = 'FAILED', 'असफल'
+
     item = models.ForeignKey(OrderItem, related_name='images', on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='order_item_images/')
+    # Files are content-addressed and shared between rows; indexed so that
+    # orders.storage.release can count the references to a blob
+    image = models.ImageField(upload_to='order_item_images/', storage=order_media_storage, max_length=255, db_index=True)
+    # Renditions written by orders.imaging once the upload has been processed
+    thumbnail = models.ImageField(
+        upload_to='order_item_images/thumbnails/', storage=order_media_storage, max_length=255, blank=True, db_index=True
+    )
+    medium = models.ImageField(
+        upload_to='order_item_images/medium/', storage=order_media_storage, max_length=255, blank=True, db_index=True
+    )
+    state = models.CharField(max_length=10, choices=State.choices, default=State.PENDING)
 
     def __str__(self):
         return f"Image for {self.item}"
+
+
+class OrderDailyStat(models.Model):
+    """Daily rollup of orders by creation day and status, kept current by
+    orders.rollups. ``appliance`` is blank on the row holding whole-order
+    totals; the other rows break the same orders down per appliance."""
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.Status.choices)
+    appliance = models.CharField(max_length=50, choices=OrderItem.Appliance.choices, blank=True)
+    orders = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "status", "appliance"], name="order_daily_stat_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status} {self.appliance or '*'}"
+
+
+class OrderSearch(models.Model):
+    """Row of the order full-text index (see backend/search.py), kept in
+    sync by orders.search."""
+
+    order = models.OneToOneField(
+        Order, primary_key=True, db_column="rowid", on_delete=models.DO_NOTHING, related_name="search"
+    )
+    body = SearchTextField()
+
+    class Meta:
+        managed = False
+        db_table = "orders_order_fts"
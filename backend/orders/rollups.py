@@ -0,0 +1,126 @@
+"""Maintenance of the OrderDailyStat rollup table.
+
+Orders are bucketed by the local date they were created on. Whenever an order
+or one of its items changes, its day is re-aggregated after the transaction
+commits; that touches only the orders of that one day, so the cost does not
+grow with the size of the orders table.
+"""
+import threading
+import weakref
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, OrderDailyStat
+
+_pending = threading.local()
+
+
+class _Refresh:
+    """on_commit callback collecting the days touched by one transaction."""
+
+    def __init__(self):
+        self.days = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        refresh_days(self.days)
+
+
+def day_of(created_at):
+    return timezone.localdate(created_at)
+
+
+def schedule_refresh(*days):
+    """Re-aggregate ``days`` once the current transaction commits.
+
+    Days scheduled several times within one transaction are refreshed once.
+    Only a weak reference to the callback is kept here: if the transaction
+    rolls back, Django drops the callback and the next call starts afresh.
+    """
+    days = {day for day in days if day is not None}
+    if not days:
+        return
+    ref = getattr(_pending, "callback", None)
+    callback = ref() if ref is not None else None
+    if callback is None or callback.done:
+        callback = _Refresh()
+        callback.days.update(days)
+        _pending.callback = weakref.ref(callback)
+        transaction.on_commit(callback)
+    else:
+        callback.days.update(days)
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def refresh_days(days):
+    for day in sorted(days):
+        refresh_day(day)
+
+
+def refresh_day(day):
+    start, end = _day_bounds(day)
+    line_total = ExpressionWrapper(
+        F("price") * F("quantity"), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+    rows = {}
+    order_totals = (
+        Order.objects
+        .filter(created_at__gte=start, created_at__lt=end)
+        .values("status")
+        .annotate(n=Count("id"), amount=Sum("total_price"))
+        .order_by()
+    )
+    for row in order_totals:
+        rows[(row["status"], "")] = (row["n"], 0, row["amount"])
+
+    appliance_totals = (
+        OrderItem.objects
+        .filter(order__created_at__gte=start, order__created_at__lt=end)
+        .values("order__status", "order_name")
+        .annotate(n=Count("order", distinct=True), qty=Sum("quantity"), amount=Sum(line_total))
+        .order_by()
+    )
+    for row in appliance_totals:
+        rows[(row["order__status"], row["order_name"])] = (row["n"], row["qty"], row["amount"])
+
+    stats = [
+        OrderDailyStat(
+            day=day, status=status, appliance=appliance,
+            orders=n, quantity=quantity or 0, revenue=revenue or Decimal("0.00"),
+        )
+        for (status, appliance), (n, quantity, revenue) in rows.items()
+    ]
+    with transaction.atomic():
+        OrderDailyStat.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=["day", "status", "appliance"],
+            update_fields=["orders", "quantity", "revenue"],
+        )
+        # Buckets that no longer have any orders
+        stale = OrderDailyStat.objects.filter(day=day)
+        for status, appliance in rows:
+            stale = stale.exclude(status=status, appliance=appliance)
+        stale.delete()
+
+
+def rebuild():
+    """Recompute every day from scratch; used to backfill or repair the table."""
+    days = set(
+        Order.objects.annotate(day=TruncDate("created_at"))
+        .values_list("day", flat=True).order_by().distinct()
+    )
+    OrderDailyStat.objects.exclude(day__in=days).delete()
+    refresh_days(days)
+    return len(days)
@@ -0,0 +1,89 @@
+"""Keeps the order full-text index (OrderSearch) in step with the data.
+
+An order's search text is its id, its items' appliance (code and Nepali
+label) and details, and its customer's username, phone and address. Orders
+touched in a transaction are re-indexed in the background once it commits;
+so are all orders of a customer whose profile changes.
+"""
+import threading
+import weakref
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from backend import tasks
+
+from . import caching
+from .models import Order, OrderItem, OrderSearch
+
+BATCH_SIZE = 500
+
+_pending = threading.local()
+
+
+class _Reindex:
+    """on_commit callback collecting the orders touched by one transaction."""
+
+    def __init__(self):
+        self.order_ids = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        tasks.enqueue(reindex, sorted(self.order_ids))
+
+
+def schedule(*order_ids):
+    """Re-index these orders once the current transaction commits; same
+    bookkeeping as rollups.schedule_refresh."""
+    ref = getattr(_pending, "callback", None)
+    callback = ref() if ref is not None else None
+    if callback is None or callback.done:
+        callback = _Reindex()
+        callback.order_ids.update(order_ids)
+        _pending.callback = weakref.ref(callback)
+        transaction.on_commit(callback)
+    else:
+        callback.order_ids.update(order_ids)
+
+
+def schedule_customer(customer_id):
+    transaction.on_commit(lambda: tasks.enqueue(reindex_customer, customer_id))
+
+
+def document(order):
+    customer = order.customer
+    parts = [str(order.pk), customer.username, customer.phone or "", customer.address or ""]
+    for item in order.items.all():
+        parts += [item.order_name, item.get_order_name_display(), item.order_details]
+    return " ".join(part for part in parts if part)
+
+
+def reindex(order_ids):
+    """Rewrite the index rows of ``order_ids``; ids of deleted orders lose theirs."""
+    items = OrderItem.objects.only("order_id", "order_name", "order_details")
+    for start in range(0, len(order_ids), BATCH_SIZE):
+        batch = order_ids[start:start + BATCH_SIZE]
+        orders = list(
+            Order.objects.filter(pk__in=batch)
+            .select_related("customer")
+            .only("customer__username", "customer__phone", "customer__address")
+            .prefetch_related(Prefetch("items", queryset=items))
+        )
+        with transaction.atomic():
+            OrderSearch.objects.filter(order_id__in=batch).delete()
+            OrderSearch.objects.bulk_create([OrderSearch(order_id=order.pk, body=document(order)) for order in orders])
+        # Cached search results may predate the new rows
+        caching.bump(*{order.customer_id for order in orders})
+
+
+def reindex_customer(customer_id):
+    reindex(list(Order.objects.filter(customer_id=customer_id).values_list("pk", flat=True)))
+
+
+def rebuild():
+    """Index every order from scratch."""
+    OrderSearch.objects.all().delete()
+    order_ids = list(Order.objects.order_by("pk").values_list("pk", flat=True))
+    reindex(order_ids)
+    return len(order_ids)
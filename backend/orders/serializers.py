@@ -1,22 +1,107 @@
+from functools import cached_property
+
 from rest_framework import serializers
-from .models import Order, OrderItem, OrderItemImage
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject, RelatedField
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.db.models.manager import BaseManager
+from django.utils.encoding import filepath_to_uri
+from backend import metrics, profiling
+from users.serializers import UserSerializer
+from .models import Order, OrderItem, OrderItemImage, items_prefetch
+from . import media
+from .storage import order_media_storage
+from . import imaging, search
 import json
 
-        
-class OrderItemImageSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField(read_only=True)  # use_url=True by default
 
-    class Meta:
-        model = OrderItemImage
-        fields = ["id", "image"]
+class LeanListSerializer(serializers.ListSerializer):
+    """many=True serializer for read-only rows.
 
-    def to_representation(self, instance):
-        rep = super().to_representation(instance)
+    Works out the child's readable fields once per list and then builds each
+    row as a plain dict, instead of going through Serializer.to_representation
+    (field iteration, OrderedDict, attribute lookups) for every row. The
+    output is the same; fields keep their own to_representation.
+    """
+
+    def to_representation(self, data):
+        if self.parent is None:
+            with profiling.measure("serialize"):
+                return self._rows(data)
+        return self._rows(data)
+
+    def _rows(self, data):
+        rows = data.all() if isinstance(data, BaseManager) else data
+        plan = []
+        for field in self.child._readable_fields:
+            # Plain model attributes are read directly; relations, nested
+            # serializers and dotted sources go through get_attribute
+            direct = (
+                len(field.source_attrs) == 1
+                and not isinstance(field, (RelatedField, serializers.ManyRelatedField, serializers.BaseSerializer))
+            )
+            plan.append((field.field_name, field.source_attrs[0] if direct else None, field))
+
+        result = []
+        for instance in rows:
+            row = {}
+            for name, attr, field in plan:
+                if attr is not None:
+                    value = getattr(instance, attr)
+                else:
+                    try:
+                        value = field.get_attribute(instance)
+                    except SkipField:
+                        continue
+                check = value.pk if isinstance(value, PKOnlyObject) else value
+                row[name] = None if check is None else field.to_representation(value)
+            result.append(row)
+        return result
+
+
+class MediaURLField(serializers.ReadOnlyField):
+    """Absolute, signed URL of a file in order media storage (a FieldFile or
+    a bare stored name); see orders/media.py. The scheme, host and MEDIA_URL
+    part and the expiry are worked out once per response rather than for
+    every image."""
+
+    @cached_property
+    def prefix(self):
         request = self.context.get("request")
-        if request and instance.image:
-            rep["image"] = request.build_absolute_uri(instance.image.url)
-        return rep
+        if not isinstance(order_media_storage, FileSystemStorage):
+            return None
+        if request is None:
+            return order_media_storage.base_url
+        return request.build_absolute_uri(order_media_storage.base_url)
 
+    @cached_property
+    def expires(self):
+        return media.url_expiry()
+
+    def to_representation(self, value):
+        name = getattr(value, "name", value)
+        if not name:
+            return None
+        if self.prefix is None:
+            request = self.context.get("request")
+            url = order_media_storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+        return self.prefix + filepath_to_uri(name) + media.signed_query(name, self.expires)
+
+
+class OrderItemImageSerializer(serializers.ModelSerializer):
+    image = MediaURLField()
+    thumbnail = MediaURLField()
+    medium = MediaURLField()
+
+    class Meta:
+        model = OrderItemImage
+        fields = ["id", "image", "thumbnail", "medium", "state"]
+        read_only_fields = ["state"]
+        list_serializer_class = LeanListSerializer
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -25,93 +110,220 @@ class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
         fields = ["id", "order_name", "order_details", "quantity", "price", "images"]
+        list_serializer_class = LeanListSerializer
 
 
 class OrderSerializer(serializers.ModelSerializer):
+    """Orders with their items and images.
+
+    On GET, ``?fields=id,status,total_price`` limits the output to those
+    fields, and ``?expand=customer`` inlines the customer instead of its id.
+    ``item_count`` and ``thumbnail`` are only there when asked for in
+    ``?fields=``; OrderViewSet.get_queryset annotates them.
+    """
+
     items = OrderItemSerializer(many=True, read_only=True)
     items_payload = serializers.JSONField(write_only=True, required=False)
+    item_count = serializers.IntegerField(read_only=True)
+    thumbnail = MediaURLField(source="thumbnail_name")
+    # Returns the current version; on update, the version the edit is based
+    # on (409 if the order has moved on since)
+    version = serializers.IntegerField(min_value=1, required=False)
+
+    OPTIONAL_FIELDS = ("item_count", "thumbnail")
+    EXPANDABLE = ("customer",)
 
     class Meta:
         model = Order
         fields = "__all__"
         read_only_fields = ["customer"]
+        list_serializer_class = LeanListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, expand = self.requested(self.context.get("request"))
+        for name in self.OPTIONAL_FIELDS:
+            if fields is None or name not in fields:
+                self.fields.pop(name)
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        if "customer" in expand and "customer" in self.fields:
+            self.fields["customer"] = UserSerializer(read_only=True)
 
+    @classmethod
+    def requested(cls, request):
+        """(fields, expand) asked for in the query string: a set of field
+        names or None for the default fields, and a set of relations.
+
+        Only reads are trimmed; writes always take and return every field.
+        """
+        if request is None or request.method not in ("GET", "HEAD"):
+            return None, set()
+        params = request.query_params
+        fields = cls._split(params.get("fields"))
+        expand = cls._split(params.get("expand")) or set()
+        if fields is not None:
+            known = {"id", "items", *cls.OPTIONAL_FIELDS, *(f.name for f in Order._meta.concrete_fields)}
+            invalid = fields - known
+            if invalid:
+                raise serializers.ValidationError({"fields": f"अमान्य फिल्ड: {', '.join(sorted(invalid))}"})
+        invalid = expand - set(cls.EXPANDABLE)
+        if invalid:
+            raise serializers.ValidationError({"expand": f"अमान्य फिल्ड: {', '.join(sorted(invalid))}"})
+        return fields, expand
+
+    @staticmethod
+    def _split(value):
+        if not value:
+            return None
+        return {part.strip() for part in value.split(",") if part.strip()} or None
+
+    def to_representation(self, instance):
+        # Single orders coming back from create/update/cancel have no (or a
+        # stale, already dropped) items prefetch; load items and images in
+        # two queries instead of one per item
+        if "items" in self.fields and "items" not in getattr(instance, "_prefetched_objects_cache", {}):
+            prefetch_related_objects([instance], items_prefetch())
+        if self.parent is None:
+            with profiling.measure("serialize"):
+                return super().to_representation(instance)
+        return super().to_representation(instance)
+
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get("request")
 
         # Extract items_payload before creating the order
         items_data = validated_data.pop("items_payload", None)
         items_data = self._coerce_items(items_data)
+        validated_data.pop("version", None)
 
         # Create order with logged-in user
         order = Order.objects.create(customer=request.user, **validated_data)
 
-        # Create order items
-        for idx, item_data in enumerate(items_data):
-            # Remove frontend-only keys
-            item_data.pop("remove_image_ids", None)
-            item_id = item_data.pop("id", None)
-
-            # Create the OrderItem
-            order_item = OrderItem.objects.create(order=order, **item_data)
-
-            # Save uploaded images for this item
-            files = request.FILES.getlist(f"item_images_{idx}")
-            for f in files:
-                OrderItemImage.objects.create(item=order_item, image=f)
+        # Create order items and their uploaded images
+        self._update_items(order, items_data, request.FILES)
 
         # Update total price
         order.update_total_price()
 
         return order
     
+    @transaction.atomic
     def update(self, instance, validated_data):
         request = self.context.get("request")
 
         # Prevent changing customer
         validated_data.pop("customer", None)
+        # The version the client's copy was read at; without one, the version
+        # loaded for this request
+        expected = validated_data.pop("version", instance.version)
+        try:
+            items_data = self._coerce_items(validated_data.pop("items_payload", None))
+        except json.JSONDecodeError:
+            items_data = []
 
-        if request.user.is_staff:
-            # Staff can update status and price
-            # All other fields are editable by staff
-            items_data = validated_data.pop("items_payload", None)
-            instance = super().update(instance, validated_data)
-            if items_data:
-                self._update_items(instance, items_data, request.FILES)
-        else:
+        if not request.user.is_staff:
             # Customer can only update items (name, details, quantity, images)
             validated_data.pop("status", None)
             validated_data.pop("total_price", None)
-            instance = super().update(instance, validated_data)
-            items_data = self.context["request"].data.get("items_payload")
-            if items_data:
-                if isinstance(items_data, str):
-                    try:
-                        items_data = json.loads(items_data)
-                    except json.JSONDecodeError:
-                        items_data = []
-                self._update_items(instance, items_data, request.FILES)
 
-        # Update total price
-        instance.update_total_price()
+        # Only the fields sent are written, and only if nobody changed the
+        # order in between (raises OrderConflict). Done even when only items
+        # change, so an edit of a stale copy is still caught.
+        instance.compare_and_set(expected, **validated_data)
+        if items_data:
+            self._update_items(instance, items_data, request.FILES)
+
+        # Update total price; only item changes affect it, and a price set by
+        # staff in this same request must not be overwritten
+        if items_data:
+            instance.update_total_price()
         return instance
-                
+
+    ITEM_FIELDS = ("order_name", "order_details", "quantity", "price")
+
     def _update_items(self, order, items_data, files_dict):
-        """Minimal fix: remove frontend-only fields so Django doesn't crash.
-        Keeps your existing logic (customer deletes all items, staff can update status/price)."""
-        order.items.all().delete()  # Keep your current delete logic
+        """Bring the order's items in line with ``items_data``.
+
+        Entries whose ``id`` belongs to this order are updated in place (only
+        if something changed), the rest are created, and existing items that
+        are not listed any more are deleted. Images are kept unless listed in
+        ``remove_image_ids``; uploads come in as ``item_images_<index>``.
+        """
+        existing = {item.id: item for item in order.items.all()}
+        to_update, to_create, updated_fields = [], [], set()
+        remove_image_ids = set()
+        uploads = []  # (item, files) in payload order
+
         for idx, item_data in enumerate(items_data):
-            # Remove frontend-only keys
-            item_data.pop("remove_image_ids", None)
-            item_id = item_data.pop("id", None)  # optional, in case frontend sends id
+            values = self._clean_item(item_data)
+            item = existing.pop(self._coerce_id(item_data.get("id")), None)
+            if item is None:
+                values.setdefault("order_name", OrderItem.Appliance.OTHER)
+                item = OrderItem(order=order, **values)
+                to_create.append(item)
+            else:
+                changed = [name for name, value in values.items() if getattr(item, name) != value]
+                for name in changed:
+                    setattr(item, name, values[name])
+                if changed:
+                    to_update.append(item)
+                    updated_fields.update(changed)
+                remove_image_ids.update(self._coerce_ids(item_data.get("remove_image_ids")))
+            uploads.append((item, files_dict.getlist(f"item_images_{idx}")))
+
+        if existing:
+            # Their images go with them through the cascade
+            OrderItem.objects.filter(pk__in=existing).delete()
+        if to_update:
+            OrderItem.objects.bulk_update(to_update, sorted(updated_fields))
+        if to_create:
+            OrderItem.objects.bulk_create(to_create)
+        if to_update or to_create:
+            # Bulk writes send no post_save, so item_changed doesn't see them
+            search.schedule(order.pk)
+        if remove_image_ids:
+            OrderItemImage.objects.filter(id__in=remove_image_ids, item__order=order).delete()
+
+        images = [OrderItemImage(item=item, image=f) for item, files in uploads for f in files]
+        if images:
+            OrderItemImage.objects.bulk_create(images)
+            metrics.images_uploaded(f for _, files in uploads for f in files)
+            # Resizing and renditions happen after the response has gone out
+            imaging.schedule(image.pk for image in images)
+
+        # Items prefetched by the viewset are stale now
+        getattr(order, "_prefetched_objects_cache", {}).pop("items", None)
 
-            # Create the OrderItem safely
-            order_item = OrderItem.objects.create(order=order, **item_data)
+    def _clean_item(self, item_data):
+        if not isinstance(item_data, dict):
+            raise serializers.ValidationError({"items_payload": "अमान्य वस्तु।"})
+        values = {}
+        for name in self.ITEM_FIELDS:
+            if name not in item_data:
+                continue
+            field = OrderItem._meta.get_field(name)
+            try:
+                values[name] = field.clean(item_data[name], None)
+            except DjangoValidationError as exc:
+                raise serializers.ValidationError({"items_payload": {name: exc.messages}})
+        return values
 
-            # Add uploaded images
-            for f in files_dict.getlist(f"item_images_{idx}"):
-                OrderItemImage.objects.create(item=order_item, image=f)
+    @staticmethod
+    def _coerce_id(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
 
+    @staticmethod
+    def _coerce_ids(ids):
+        try:
+            return {int(i) for i in ids or []}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({"items_payload": {"remove_image_ids": "अमान्य आईडी।"}})
 
     def _coerce_items(self, items_data):
         if not items_data:
@@ -119,3 +331,21 @@ class OrderSerializer(serializers.ModelSerializer):
         if isinstance(items_data, str):
             return json.loads(items_data)
         return items_data
+
+
+class BulkOrderOperationSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=["cancel"], required=False)
+    status = serializers.ChoiceField(choices=Order.Status.choices, required=False)
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+
+    def validate(self, data):
+        if data.get("action") == "cancel" and "status" in data:
+            raise serializers.ValidationError("रद्द गर्दा स्थिति पठाउन मिल्दैन।")
+        if not {"action", "status", "total_price"} & data.keys():
+            raise serializers.ValidationError("कुनै परिवर्तन छैन।")
+        return data
+
+
+class BulkOrderSerializer(serializers.Serializer):
+    operations = BulkOrderOperationSerializer(many=True, allow_empty=False, max_length=1000)
@@ -0,0 +1,64 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend import metrics
+from users.models import User
+from users.signals import SEARCH_FIELDS
+
+from . import caching, events, rollups, search, storage
+from .models import Order, OrderItem, OrderItemImage
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    rollups.schedule_refresh(rollups.day_of(instance.created_at))
+    caching.bump(instance.customer_id)
+    events.touched(instance.pk, instance.customer_id)
+    # Status and totals aren't searchable; only new and deleted orders matter
+    if kwargs.get("created") or kwargs["signal"] is post_delete:
+        search.schedule(instance.pk)
+    if kwargs["signal"] is post_save:
+        if kwargs["created"]:
+            metrics.order_created()
+        elif getattr(instance, "_loaded_status", None) is not None:
+            metrics.order_transition(instance._loaded_status, instance.status)
+        instance._loaded_status = instance.status
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def item_changed(sender, instance, **kwargs):
+    if OrderItem.order.is_cached(instance):
+        order = instance.order
+        created_at, customer_id = order.created_at, order.customer_id
+    else:
+        # The order may already be gone when items are cascade-deleted; its own
+        # post_delete covers that case
+        row = Order.objects.filter(pk=instance.order_id).values_list("created_at", "customer_id").first()
+        if row is None:
+            return
+        created_at, customer_id = row
+    rollups.schedule_refresh(rollups.day_of(created_at))
+    caching.bump(customer_id)
+    events.touched(instance.order_id, customer_id)
+    search.schedule(instance.order_id)
+
+
+@receiver(post_save, sender=User)
+def customer_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Customer details are part of every one of their orders' search text
+    if not created and (update_fields is None or SEARCH_FIELDS & set(update_fields)):
+        search.schedule_customer(instance.pk)
+
+
+@receiver(post_delete, sender=OrderItemImage)
+def release_image_files(sender, instance, **kwargs):
+    # Only once the row is really gone, so a rollback keeps the files; blobs
+    # shared with other images stay
+    names = [field.name for field in (instance.image, instance.thumbnail, instance.medium) if field.name]
+    if names:
+        transaction.on_commit(partial(storage.release, *names))
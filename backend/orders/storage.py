@@ -0,0 +1,97 @@
+"""Content-addressed storage for order item images.
+
+Every file is stored once, under the SHA-256 of its bytes:
+
+    order_item_images/3f/3fa4...c9.jpg
+
+Saving the same photo again, from another item or a later edit, reuses the
+existing blob instead of writing a copy. A blob is only deleted once no
+OrderItemImage row refers to it any more; see ``release``.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Q
+from django.utils._os import safe_makedirs
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save, and an existing
+        # blob of the same name is by definition the same file
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        self._makedirs(self.path(directory))
+
+        # Hash while streaming into a temporary file next to the final one,
+        # so the upload is read exactly once
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.path(directory), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+
+            hexdigest = digest.hexdigest()
+            blob_name = posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+            blob_path = self.path(blob_name)
+            self._makedirs(os.path.dirname(blob_path))
+            if os.path.exists(blob_path):
+                # Shared blob: refresh its mtime so a concurrent release()
+                # leaves it alone until our row is committed
+                os.utime(blob_path)
+            else:
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, blob_path)
+                temp_path = None
+        finally:
+            if temp_path is not None:
+                os.remove(temp_path)
+        return blob_name
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is not None:
+            safe_makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def is_recent(self, name):
+        try:
+            age = time.time() - os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return age < settings.ORDER_MEDIA_GRACE_SECONDS
+
+
+order_media_storage = ContentAddressedStorage()
+
+
+def is_referenced(name):
+    from .models import OrderItemImage
+
+    return OrderItemImage.objects.filter(Q(image=name) | Q(thumbnail=name) | Q(medium=name)).exists()
+
+
+def release(*names):
+    """Delete each blob in ``names`` that no OrderItemImage uses any more.
+
+    The reference count is the number of rows naming the blob in any of the
+    (indexed) image columns. Blobs written or re-used within the last
+    ORDER_MEDIA_GRACE_SECONDS are kept, because a row pointing at them may not
+    be committed yet; ``manage.py cleanup_order_media`` collects those later.
+    """
+    for name in names:
+        if not name or is_referenced(name) or order_media_storage.is_recent(name):
+            continue
+        order_media_storage.delete(name)
@@ -1,3 +1,699 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from unittest import mock
+from urllib.parse import urlencode, urlsplit
 
-# Create your tests here.
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from backend import metrics
+from backend.profiling import _logged_path
+from users.blacklist import RefreshToken
+from users.models import User
+
+from . import media
+from .events import CacheBroker
+from .models import Order, OrderConflict, OrderItem, OrderItemImage
+from .serializers import LeanListSerializer
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class OrderAPITestCase(TransactionTestCase):
+    """Runs against real commits, since caching, search and events all act
+    in on_commit callbacks."""
+
+    def setUp(self):
+        self.customer = User.objects.create_user(username="ram", password="pw-Strong-123")
+        self.staff = User.objects.create_user(username="boss", password="pw-Strong-123", is_staff=True)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def create_order(self, **item):
+        item = {"order_name": "TV", "order_details": "चल्दैन", "quantity": 1, **item}
+        response = self.client_for(self.customer).post(
+            "/api/orders/", {"items_payload": json.dumps([item])}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+
+class OrderSearchTests(OrderAPITestCase):
+    def search(self, text):
+        response = self.client_for(self.staff).get("/api/orders/", {"q": text})
+        return [order["id"] for order in response.data["results"]]
+
+    def test_edited_item_text_is_searchable(self):
+        order = self.create_order(order_details="screen flickers")
+        item_id = order["items"][0]["id"]
+        self.assertEqual(self.search("flickers"), [order["id"]])
+
+        response = self.client_for(self.customer).patch(
+            f"/api/orders/{order['id']}/",
+            {"items_payload": json.dumps([{"id": item_id, "order_details": "remote missing"}])},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.search("remote"), [order["id"]])
+        self.assertEqual(self.search("flickers"), [])
+
+    def test_added_item_text_is_searchable(self):
+        order = self.create_order()
+        item_id = order["items"][0]["id"]
+        response = self.client_for(self.customer).patch(
+            f"/api/orders/{order['id']}/",
+            {"items_payload": json.dumps([{"id": item_id}, {"order_name": "OTHER", "order_details": "doorbell"}])},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(OrderItem.objects.filter(order_id=order["id"]).count(), 2)
+        self.assertEqual(self.search("doorbell"), [order["id"]])
+
+
+def walk(client, url):
+    """Ids on every page from ``url`` following the next links, then the
+    same pages read back through the previous links."""
+    pages = [client.get(url).data]
+    while pages[-1]["next"]:
+        pages.append(client.get(pages[-1]["next"]).data)
+    forward = [row["id"] for page in pages for row in page["results"]]
+    backward = [row["id"] for row in pages[-1]["results"]]
+    page = pages[-1]
+    while page["previous"]:
+        page = client.get(page["previous"]).data
+        backward[:0] = [row["id"] for row in page["results"]]
+    return forward, backward
+
+
+class OrderListTests(OrderAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.create_order()["id"] for _ in range(7)]
+        self.client = self.client_for(self.staff)
+
+    def at(self, ids, *moment):
+        Order.objects.filter(pk__in=ids).update(created_at=timezone.make_aware(datetime(*moment)))
+
+    def list(self, **params):
+        response = self.client.get("/api/orders/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [order["id"] for order in response.data["results"]]
+
+    def test_cursor_with_ties(self):
+        self.at(self.ids[:4], 2026, 1, 10, 12)
+        self.at(self.ids[4:], 2026, 1, 9, 12)
+        expected = self.ids[3::-1] + self.ids[:3:-1]
+        self.assertEqual(walk(self.client, "/api/orders/?page_size=2"), (expected, expected))
+
+    def test_cursor_with_search_ordering(self):
+        expected = self.list(q="चल्दैन", page_size=100)
+        self.assertEqual(sorted(expected), self.ids)
+        url = "/api/orders/?" + urlencode({"q": "चल्दैन", "page_size": 3})
+        self.assertEqual(walk(self.client, url), (expected, expected))
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/api/orders/", {"cursor": "junk"}).status_code, 404)
+
+    def test_status_filter(self):
+        Order.objects.filter(pk=self.ids[0]).update(status=Order.Status.COMPLETED)
+        Order.objects.filter(pk=self.ids[1]).update(status=Order.Status.REJECTED)
+        self.assertEqual(self.list(status="COMPLETED"), [self.ids[0]])
+        self.assertEqual(self.list(status="COMPLETED, REJECTED"), [self.ids[1], self.ids[0]])
+        response = self.client.get("/api/orders/", {"status": "COMPLETED,DONE"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("DONE", response.data["status"])
+
+    def test_date_filters(self):
+        a, b, c, d = self.ids[:4]
+        Order.objects.filter(pk__in=self.ids[4:]).delete()
+        self.at([a], 2026, 1, 9, 23, 59, 59)
+        self.at([b], 2026, 1, 10, 0, 0)
+        self.at([c], 2026, 1, 10, 23, 59, 59)
+        self.at([d], 2026, 1, 11, 0, 0)
+        self.assertEqual(self.list(created_after="2026-01-10"), [d, c, b])
+        self.assertEqual(self.list(created_before="2026-01-10"), [c, b, a])
+        self.assertEqual(self.list(created_after="2026-01-10", created_before="2026-01-10"), [c, b])
+        self.assertEqual(self.list(created_after="2026-01-10T12:00:00"), [d, c])
+        response = self.client.get("/api/orders/", {"created_before": "2026-13-01"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("created_before", response.data)
+
+
+class OrderVersionTests(OrderAPITestCase):
+    def patch(self, user, order_id, data):
+        return self.client_for(user).patch(f"/api/orders/{order_id}/", data, format="json")
+
+    def cancel(self, order_id, data=None):
+        return self.client_for(self.customer).post(f"/api/orders/{order_id}/cancel/", data or {}, format="json")
+
+    def test_stale_patch_conflicts(self):
+        order = self.create_order()
+        version = order["version"]
+        response = self.patch(self.staff, order["id"], {"status": "COMPLETED", "version": version})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["version"], version + 1)
+
+        response = self.patch(self.staff, order["id"], {"total_price": "500.00", "version": version})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["current"]["status"], "COMPLETED")
+        self.assertEqual(response.data["current"]["version"], version + 1)
+        row = Order.objects.get(pk=order["id"])
+        self.assertEqual(str(row.total_price), "0.00")
+        self.assertEqual(row.version, version + 1)
+
+    def test_stale_cancel_conflicts(self):
+        order = self.create_order()
+        version = order["version"]
+        self.assertEqual(self.patch(self.staff, order["id"], {"total_price": "500.00"}).status_code, 200)
+
+        response = self.cancel(order["id"], {"version": version})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["current"]["total_price"], "500.00")
+        self.assertEqual(Order.objects.get(pk=order["id"]).status, Order.Status.PENDING)
+
+        response = self.cancel(order["id"], {"version": response.data["current"]["version"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], Order.Status.CANCELLED)
+
+    def test_write_without_version(self):
+        order = self.create_order()
+        response = self.patch(self.staff, order["id"], {"status": "COMPLETED"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["version"], order["version"] + 1)
+        other = self.create_order()
+        self.assertEqual(self.cancel(other["id"]).status_code, 200)
+
+    def test_customer_edit_keeps_status(self):
+        order = self.create_order()
+        self.patch(self.staff, order["id"], {"status": "COMPLETED"})
+        response = self.patch(self.customer, order["id"], {"status": "PENDING", "total_price": "1.00"})
+        self.assertEqual(response.status_code, 200)
+        row = Order.objects.get(pk=order["id"])
+        self.assertEqual((row.status, str(row.total_price)), (Order.Status.COMPLETED, "0.00"))
+
+    def test_save_bumps_version(self):
+        order = Order.objects.get(pk=self.create_order()["id"])
+        version = order.version
+        order.save()
+        self.assertEqual(order.version, version + 1)
+        order.save(update_fields=["status"])
+        self.assertEqual(Order.objects.get(pk=order.pk).version, version + 2)
+
+    def test_compare_and_set(self):
+        order = Order.objects.get(pk=self.create_order()["id"])
+        version = order.version
+        order.compare_and_set(version, status=Order.Status.REJECTED)
+        self.assertEqual(order.version, version + 1)
+        with self.assertRaises(OrderConflict):
+            order.compare_and_set(version, status=Order.Status.PENDING)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, Order.Status.REJECTED)
+
+
+class BulkOrderTests(OrderAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.create_order()["id"] for _ in range(4)]
+
+    def bulk(self, operations, user=None):
+        return self.client_for(user or self.staff).post(
+            "/api/orders/bulk/", {"operations": operations}, format="json"
+        )
+
+    def order_updates(self, queries):
+        return [q["sql"] for q in queries if q["sql"].startswith('UPDATE "orders_order"')]
+
+    def test_grouped_updates(self):
+        a, b, c, d = self.ids
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk([
+                {"id": a, "status": "COMPLETED"},
+                {"id": b, "status": "COMPLETED"},
+                {"id": c, "total_price": "250.00"},
+                {"id": d, "action": "cancel"},
+            ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTrue(all(result["ok"] for result in response.data["results"]))
+        self.assertEqual(len(self.order_updates(queries.captured_queries)), 3)  # one per distinct change
+        rows = {order.pk: order for order in Order.objects.filter(pk__in=self.ids)}
+        self.assertEqual([rows[pk].status for pk in self.ids], ["COMPLETED", "COMPLETED", "PENDING", "CANCELLED"])
+        self.assertEqual(str(rows[c].total_price), "250.00")
+
+    def test_final_orders_and_unknown_ids(self):
+        a, b = self.ids[:2]
+        self.bulk([{"id": a, "status": "REJECTED"}])
+        response = self.bulk([
+            {"id": a, "status": "PENDING"},
+            {"id": 999999, "status": "COMPLETED"},
+            {"id": b, "total_price": "10.00"},
+            {"id": b, "status": "COMPLETED"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([result["ok"] for result in results], [False, False, True, False])
+        self.assertEqual(results[0]["detail"], "पूरा वा अस्वीकृत अर्डर परिवर्तन गर्न मिल्दैन।")
+        self.assertEqual(results[1]["detail"], "अर्डर फेला परेन।")
+        self.assertEqual(results[3]["detail"], "एउटै अर्डर दोहोरियो।")
+        self.assertEqual(Order.objects.get(pk=a).status, Order.Status.REJECTED)
+        self.assertEqual(Order.objects.get(pk=b).status, Order.Status.PENDING)
+
+    def test_version_bumped(self):
+        versions = dict(Order.objects.filter(pk__in=self.ids).values_list("pk", "version"))
+        self.bulk([{"id": pk, "status": "COMPLETED"} for pk in self.ids[:2]])
+        after = dict(Order.objects.filter(pk__in=self.ids).values_list("pk", "version"))
+        self.assertEqual([after[pk] - versions[pk] for pk in self.ids], [1, 1, 0, 0])
+
+    def test_staff_only(self):
+        response = self.bulk([{"id": self.ids[0], "action": "cancel"}], user=self.customer)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Order.objects.get(pk=self.ids[0]).status, Order.Status.PENDING)
+
+    def test_invalid_operations(self):
+        self.assertEqual(self.bulk([]).status_code, 400)
+        self.assertEqual(self.bulk([{"id": self.ids[0]}]).status_code, 400)
+        self.assertEqual(self.bulk([{"id": self.ids[0], "action": "cancel", "status": "COMPLETED"}]).status_code, 400)
+
+
+class OrderEventStreamTests(OrderAPITestCase):
+    def stream_status(self, query):
+        """Status of GET /api/orders/events/?<query>, disconnecting right after."""
+
+        async def scenario():
+            received = asyncio.Queue()
+            requests = asyncio.Queue()
+            await requests.put({"type": "http.request", "body": b"", "more_body": False})
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": "/api/orders/events/", "root_path": "", "query_string": query.encode(),
+                "headers": [], "server": ("testserver", 80), "client": ("127.0.0.1", 1),
+            }
+            app = asyncio.create_task(get_asgi_application()(scope, requests.get, received.put))
+            start = await asyncio.wait_for(received.get(), 5)
+            await requests.put({"type": "http.disconnect"})
+            await asyncio.wait_for(app, 5)
+            return start["status"]
+
+        return asyncio.run(scenario())
+
+    def ticket(self):
+        response = self.client_for(self.customer).post("/api/orders/events/ticket/")
+        self.assertEqual(response.status_code, 200)
+        return response.data["ticket"]
+
+    def test_ticket_opens_the_stream_once(self):
+        ticket = self.ticket()
+        self.assertEqual(self.stream_status(f"ticket={ticket}"), 200)
+        self.assertEqual(self.stream_status(f"ticket={ticket}"), 401)
+
+    def test_expired_or_forged_ticket(self):
+        ticket = self.ticket()
+        with override_settings(ORDER_EVENTS_TICKET_SECONDS=-1):
+            self.assertEqual(self.stream_status(f"ticket={ticket}"), 401)
+        self.assertEqual(self.stream_status(f"ticket={ticket[:-2]}xx"), 401)
+
+    def test_access_token_in_url_is_refused(self):
+        token = RefreshToken.for_user(self.customer).access_token
+        self.assertEqual(self.stream_status(f"token={token}"), 401)
+        self.assertEqual(self.stream_status(f"ticket={token}"), 401)
+
+    def test_inactive_user(self):
+        ticket = self.ticket()
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertEqual(self.stream_status(f"ticket={ticket}"), 401)
+
+
+class OrderExportTests(OrderAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = [self.create_order(order_details=f"item {n}") for n in range(3)]
+        Order.objects.create(customer=self.customer)  # no items
+        self.token = RefreshToken.for_user(self.staff).access_token
+
+    async def export(self, query):
+        response = await AsyncClient().get(
+            f"/api/orders/export/?{query}", headers={"Authorization": f"Bearer {self.token}"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        return "".join([chunk.decode() async for chunk in response.streaming_content])
+
+    async def test_csv_streams_asynchronously(self):
+        lines = (await self.export("output=csv&include_customer=1")).splitlines()
+        self.assertTrue(lines[0].startswith("order_id,order_status"))
+        self.assertIn("customer_username", lines[0])
+        self.assertEqual(len(lines), 1 + 4)
+        for order, line in zip(self.orders, lines[1:]):
+            self.assertTrue(line.startswith(f"{order['id']},PENDING"))
+            self.assertIn(f",ram,", line)
+            self.assertIn(order["items"][0]["order_details"], line)
+        self.assertTrue(lines[-1].endswith(",,,,"))
+
+    async def test_ndjson_streams_asynchronously(self):
+        rows = [json.loads(line) for line in (await self.export("output=ndjson")).splitlines()]
+        self.assertEqual([row["id"] for row in rows[:3]], [order["id"] for order in self.orders])
+        self.assertEqual(rows[0]["items"][0]["order_details"], "item 0")
+        self.assertEqual(rows[3]["items"], [])
+
+    def test_sync_request(self):
+        response = self.client_for(self.staff).get("/api/orders/export/", {"output": "ndjson"})
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 4)
+
+
+def photo(size=(400, 300)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "PNG")
+    return SimpleUploadedFile("photo.png", buffer.getvalue(), content_type="image/png")
+
+
+class MediaTestCase(OrderAPITestCase):
+    """Orders with uploaded photos, stored in a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=media_root, ORDER_MEDIA_GRACE_SECONDS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_order_with_photo(self):
+        response = self.client_for(self.customer).post(
+            "/api/orders/",
+            {"items_payload": json.dumps([{"order_name": "TV"}]), "item_images_0": [photo()]},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+
+class MediaTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        order = self.create_order_with_photo()
+        detail = self.client_for(self.customer).get(f"/api/orders/{order['id']}/").data
+        url = urlsplit(detail["items"][0]["images"][0]["image"])
+        self.signed = f"{url.path}?{url.query}"
+        self.path = url.path
+        self.name = url.path.removeprefix("/media/")
+
+    def get(self, path, user=None, **headers):
+        headers = {f"HTTP_{key.upper()}": value for key, value in headers.items()}
+        if user is not None:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {RefreshToken.for_user(user).access_token}"
+        return self.client.get(path, **headers)
+
+    def test_signed_url(self):
+        response = self.get(self.signed)
+        self.assertEqual(response.status_code, 200)
+        body = b"".join(response.streaming_content)
+        self.assertEqual(body[:2], b"\xff\xd8")  # stored as JPEG
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn(response["ETag"].strip('"'), self.name)
+
+    def test_expired_or_tampered_signature(self):
+        expired = int(time.time()) - 10
+        self.assertEqual(self.get(f"{self.path}?e={expired}&s={media.signature(self.name, expired)}").status_code, 403)
+        self.assertEqual(self.get(self.signed.replace("&s=", "&s=0")).status_code, 403)
+        later = media.url_expiry() + 3600
+        self.assertEqual(self.get(f"{self.path}?e={later}&s={self.signed.rsplit('=', 1)[1]}").status_code, 403)
+
+    def test_anonymous_without_signature(self):
+        self.assertEqual(self.get(self.path).status_code, 403)
+
+    def test_jwt_users(self):
+        other = User.objects.create_user(username="hari", password="pw-Strong-123")
+        self.assertEqual(self.get(self.path, self.customer).status_code, 200)
+        self.assertEqual(self.get(self.path, other).status_code, 403)
+        self.assertEqual(self.get(self.path, self.staff).status_code, 200)
+
+    def test_not_modified(self):
+        etag = self.get(self.signed)["ETag"]
+        response = self.get(self.signed, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_ranges(self):
+        body = b"".join(self.get(self.signed).streaming_content)
+        response = self.get(self.signed, range="bytes=0-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, body[:10])
+        self.assertEqual(response["Content-Range"], f"bytes 0-9/{len(body)}")
+        self.assertEqual(self.get(self.signed, range="bytes=-5").content, body[-5:])
+        response = self.get(self.signed, range=f"bytes={len(body)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(body)}")
+
+    def test_accel_redirect(self):
+        with self.settings(ORDER_MEDIA_DELIVERY="x-accel-redirect"):
+            response = self.get(self.signed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.name)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+
+
+class OrderItemUpdateTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self.create_order_with_photo()
+        self.item = self.order["items"][0]
+
+    def edit(self, items, order_id=None, files=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_for(self.staff).patch(
+                f"/api/orders/{order_id or self.order['id']}/",
+                {"items_payload": json.dumps(items), **(files or {})},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.queries = [q["sql"] for q in queries.captured_queries]
+        return response.data
+
+    def item_updates(self):
+        return [sql for sql in self.queries if sql.startswith('UPDATE "orders_orderitem"')]
+
+    def test_unchanged_items_are_not_written(self):
+        self.edit([{key: self.item[key] for key in ("id", "order_name", "order_details", "quantity")}])
+        self.assertEqual(self.item_updates(), [])
+        self.assertFalse([sql for sql in self.queries if sql.startswith('INSERT INTO "orders_orderitem"')])
+
+    def test_only_changed_fields_are_updated(self):
+        data = self.edit([{"id": self.item["id"], "order_name": "TV", "order_details": "no sound"}])
+        [update] = self.item_updates()
+        self.assertIn('"order_details" = CASE', update)
+        self.assertNotIn('"order_name"', update)
+        self.assertNotIn('"quantity"', update)
+        self.assertEqual(data["items"][0]["order_details"], "no sound")
+        self.assertEqual(len(data["items"][0]["images"]), 1)  # kept
+
+    def test_new_and_removed_items(self):
+        data = self.edit([{"order_name": "FRIDGE", "quantity": 2}, {"id": "junk", "order_details": "x"}])
+        self.assertEqual(sorted(item["order_name"] for item in data["items"]), ["FRIDGE", "OTHER"])
+        self.assertFalse(OrderItem.objects.filter(pk=self.item["id"]).exists())
+        self.assertFalse(OrderItemImage.objects.filter(item_id=self.item["id"]).exists())
+
+    def test_remove_image_ids_of_this_order_only(self):
+        other = self.create_order_with_photo()
+        other_image = other["items"][0]["images"][0]["id"]
+        own_image = self.item["images"][0]["id"]
+        self.edit([{"id": self.item["id"], "remove_image_ids": [own_image, other_image]}])
+        self.assertFalse(OrderItemImage.objects.filter(pk=own_image).exists())
+        self.assertTrue(OrderItemImage.objects.filter(pk=other_image).exists())
+
+    def test_total_recomputed(self):
+        data = self.edit([
+            {"id": self.item["id"], "price": "100.00", "quantity": 2},
+            {"order_name": "OTHER", "price": "50.00", "quantity": 1},
+        ])
+        self.assertEqual(data["total_price"], "250.00")
+        data = self.edit([{"id": self.item["id"]}])
+        self.assertEqual(data["total_price"], "200.00")
+
+
+class OrderFieldsTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self.create_order_with_photo()
+        self.create_order(price="120.50", quantity=2)
+
+    def list(self, query=""):
+        cache.clear()  # no cached payload from an earlier request
+        response = self.client_for(self.staff).get(f"/api/orders/{query}")
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.json()["results"]
+
+    def test_fields(self):
+        rows = self.list("?fields=id,status,item_count,thumbnail")
+        self.assertEqual({frozenset(row) for row in rows}, {frozenset(["id", "status", "item_count", "thumbnail"])})
+        row = next(row for row in rows if row["id"] == self.order["id"])
+        self.assertEqual(row["item_count"], 1)
+        self.assertTrue(row["thumbnail"])
+        self.assertNotIn("item_count", self.list()[0])
+
+    def test_expand_customer(self):
+        self.assertEqual(self.list()[0]["customer"], self.customer.pk)
+        customer = self.list("?expand=customer")[0]["customer"]
+        self.assertEqual((customer["id"], customer["username"]), (self.customer.pk, "ram"))
+
+    def test_unknown_names(self):
+        client = self.client_for(self.staff)
+        response = client.get("/api/orders/?fields=id,secret")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.data["fields"])
+        response = client.get("/api/orders/?expand=items")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("items", response.data["expand"])
+
+    def test_writes_ignore_parameters(self):
+        response = self.client_for(self.staff).patch(
+            f"/api/orders/{self.order['id']}/?fields=id&expand=customer",
+            {"status": "COMPLETED"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["customer"], self.customer.pk)
+        self.assertIn("items", response.data)
+        self.assertNotIn("item_count", response.data)
+
+    def test_lean_output_matches_list_serializer(self):
+        for query in ("", "?expand=customer", "?fields=id,items,item_count,thumbnail,total_price"):
+            lean = self.list(query)
+            with mock.patch.object(LeanListSerializer, "to_representation", serializers.ListSerializer.to_representation):
+                plain = self.list(query)
+            self.assertEqual(lean, plain)
+            self.assertEqual([list(row) for row in lean], [list(row) for row in plain])
+
+
+class CacheBrokerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.publisher, self.broker = CacheBroker(), CacheBroker()
+        self.delivered = []
+        self.broker.fan_out = lambda kind, event: self.delivered.append(event["id"])
+        self.broker.poller = threading.current_thread()  # polled by hand below
+
+    def test_entry_stored_after_the_poll(self):
+        self.publisher.publish("order", {"id": 1, "customer": 3})
+        # Numbered, but the publisher hasn't stored the entry yet
+        seq = cache.incr(CacheBroker.SEQUENCE_KEY)
+        self.publisher.publish("order", {"id": 3, "customer": 3})
+        missing = {}
+        seen = self.broker._poll_once(0, missing)
+        self.assertEqual(self.delivered, [1, 3])
+        self.assertEqual(list(missing), [seq])
+
+        cache.set(CacheBroker._entry_key(seq), (self.publisher.origin, "order", {"id": 2, "customer": 3}))
+        seen = self.broker._poll_once(seen, missing)
+        self.assertEqual(self.delivered, [1, 3, 2])
+        self.assertEqual(missing, {})
+        self.broker._poll_once(seen, missing)
+        self.assertEqual(self.delivered, [1, 3, 2])
+
+    def test_missing_entry_given_up(self):
+        # Numbered by a publisher that died before storing the entry
+        cache.set(CacheBroker.SEQUENCE_KEY, 1, None)
+        missing = {}
+        seen = self.broker._poll_once(0, missing)
+        self.assertEqual(list(missing), [1])
+        missing[1] = 0  # as if ORDER_EVENTS_RETENTION_SECONDS had passed
+        self.broker._poll_once(seen, missing)
+        self.assertEqual(missing, {})
+
+    async def test_listeners_in_other_processes(self):
+        self.assertFalse(self.publisher.has_listeners())
+        subscription = self.broker.subscribe(User(pk=3))
+        self.assertTrue(self.publisher.has_listeners())
+        cache.delete(CacheBroker.LISTENERS_KEY)  # as if it had expired
+        self.broker._poll_once(0, {})
+        self.assertTrue(self.publisher.has_listeners())
+
+        subscription.close()
+        cache.delete(CacheBroker.LISTENERS_KEY)
+        self.broker._poll_once(0, {})
+        self.assertFalse(self.publisher.has_listeners())
+
+
+class LoggedPathTests(SimpleTestCase):
+    def test_secrets_removed(self):
+        factory = RequestFactory()
+        request = factory.get("/api/orders/events/", {"ticket": "abc", "status": "PENDING"})
+        self.assertEqual(_logged_path(request), "/api/orders/events/?status=PENDING")
+        request = factory.get("/media/a.jpg", {"e": "1", "s": "sig"})
+        self.assertEqual(_logged_path(request), "/media/a.jpg?e=1")
+        self.assertEqual(_logged_path(factory.get("/api/orders/", {"q": "tv"})), "/api/orders/?q=tv")
+
+
+class MetricsFilesTests(SimpleTestCase):
+    def setUp(self):
+        for metric in metrics._registry.values():
+            patcher = mock.patch.object(metric, "values", {})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(metrics._state, pid=None, path=None)  # a file in this directory
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, snapshot):
+        with open(f"{self.directory}/{name}", "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+
+    def test_files_are_merged(self):
+        self.write("1-1.json", {
+            "http_responses_total": [[["orders-list", "GET", "200"], 2]],
+            "http_request_db_queries": [[["orders-list"], [0, 0, 0, 1, 0, 0, 0, 0, 0, 3]]],
+            "retired_metric_total": [[[], 7]],
+        })
+        self.write("2-1.json", {
+            "http_responses_total": [[["orders-list", "GET", "200"], 3], [["login", "POST", "400"], 1]],
+            "http_request_db_queries": [[["orders-list"], [0, 0, 0, 1, 0, 0, 0, 0, 1, 203]]],
+        })
+        self.write("3-1.json.tmp", {"http_responses_total": [[["login", "POST", "400"], 100]]})
+        with self.settings(METRICS_DIR=self.directory):
+            metrics.ORDERS_CREATED.inc()  # this process, written by collect()
+            lines = metrics.render(metrics.collect()).splitlines()
+        for line in [
+            'http_responses_total{route="orders-list",method="GET",status="200"} 5',
+            'http_responses_total{route="login",method="POST",status="400"} 1',
+            'http_request_db_queries_bucket{route="orders-list",le="2"} 0',
+            'http_request_db_queries_bucket{route="orders-list",le="5"} 2',
+            'http_request_db_queries_bucket{route="orders-list",le="+Inf"} 3',
+            'http_request_db_queries_sum{route="orders-list"} 206',
+            'http_request_db_queries_count{route="orders-list"} 3',
+            "orders_created_total 1",
+        ]:
+            self.assertIn(line, lines)
+        self.assertFalse([line for line in lines if "retired" in line])
+
+    def test_flushed_by_timer(self):
+        with self.settings(METRICS_DIR=self.directory, METRICS_FLUSH_SECONDS=0.05):
+            metrics.ORDERS_CREATED.inc()
+            self.assertEqual(os.listdir(self.directory), [])  # not on the caller's thread
+            metrics._start_timer()
+            for _ in range(100):
+                if os.listdir(self.directory):
+                    break
+                time.sleep(0.02)
+            [name] = os.listdir(self.directory)
+            with open(f"{self.directory}/{name}", encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["orders_created_total"], [[[], 1]])
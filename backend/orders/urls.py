@@ -1,7 +1,14 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet
+from .views import OrderViewSet, order_list, order_detail, order_events, order_events_ticket
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename="orders")
 
-urlpatterns = router.urls
+urlpatterns = [
+    # Async GET for the hot read endpoints; listed first so they win over the router's
+    path("orders/", order_list, name="orders-list"),
+    path("orders/<int:pk>/", order_detail, name="orders-detail"),
+    path("orders/events/", order_events, name="orders-events"),
+    path("orders/events/ticket/", order_events_ticket, name="orders-events-ticket"),
+] + router.urls
@@ -2,20 +2,116 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
-from .models import Order, OrderItem, OrderItemImage
-from .serializers import OrderSerializer
+from rest_framework.exceptions import NotFound
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from .models import Order, OrderConflict, OrderItem, OrderItemImage, OrderDailyStat, items_prefetch
+from .serializers import OrderSerializer, BulkOrderSerializer
+from .filters import OrderFilterBackend
+from . import bulk, caching, events, export
+from backend.async_views import async_api_view
+from backend.pagination import KeysetPagination
+from backend.routers import read_replica, replica_alias
+from decimal import Decimal
 import json
 
+EXPORT_FORMATS = {
+    "csv": (export.CSVFormat, "text/csv; charset=utf-8"),
+    "ndjson": (export.NDJSONFormat, "application/x-ndjson; charset=utf-8"),
+}
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_backends = [OrderFilterBackend]
+
+    # Status counts reported by `reports`, keyed as in _report_payload
+    REPORT_STATUSES = {
+        "completed": Order.Status.COMPLETED,
+        "rejected": Order.Status.REJECTED,
+        "pending": Order.Status.PENDING,
+        "cancelled": Order.Status.CANCELLED,
+    }
 
     def get_queryset(self):
         user = self.request.user
+        # Load only what the requested fields need (see OrderSerializer)
+        fields, expand = OrderSerializer.requested(self.request)
+        qs = Order.objects.all()
+        if fields is None or "items" in fields:
+            qs = qs.prefetch_related(items_prefetch())
+        if "customer" in expand:
+            qs = qs.select_related("customer")
+        if fields is not None and "item_count" in fields:
+            qs = qs.with_item_count()
+        if fields is not None and "thumbnail" in fields:
+            qs = qs.with_thumbnail()
         if user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(customer=user)
+            return qs
+        return qs.filter(customer=user)
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, super().retrieve, *args, **kwargs)
+
+    async def alist(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    async def aretrieve(self, request, pk):
+        queryset = self.filter_queryset(self.get_queryset())
+        instance = await queryset.filter(pk=pk).afirst()
+        if instance is None:
+            raise NotFound()
+        self.check_object_permissions(request, instance)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    async def aconditional(self, request, view, *args, **kwargs):
+        """_conditional for the async endpoints below."""
+        self.check_permissions(request)
+        etag = await caching.aetag_for(request)
+        if caching.is_current(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = await caching.aget_response_data(etag)
+            if data is None:
+                response = await view(request, *args, **kwargs)
+                await caching.aset_response_data(etag, response.data)
+            else:
+                response = Response(data)
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    def _conditional(self, request, view, *args, **kwargs):
+        """Answer from the order version stamp when possible: 304 if the client
+        already has this version, otherwise the cached payload, and only run
+        the query and serializers when neither applies."""
+        etag = caching.etag_for(request)
+        if caching.is_current(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = caching.get_response_data(etag)
+            if data is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    caching.set_response_data(etag, response.data)
+            else:
+                response = Response(data)
+        response["ETag"] = etag
+        # Always revalidate, never share between users
+        response["Cache-Control"] = "private, no-cache"
+        return response
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -28,6 +124,25 @@ class OrderViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         serializer.save()  # update logic is handled in serializer
 
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except OrderConflict as conflict:
+            return self._conflict(conflict.order_id)
+
+    def _conflict(self, order_id):
+        """409 with the order as it is now, for the client to merge or retry."""
+        current = self.get_queryset().filter(pk=order_id).first()
+        if current is None:
+            raise NotFound()
+        return Response(
+            {
+                "detail": "अर्डर अरू कसैले परिवर्तन गरिसकेको छ। नयाँ विवरण हेरेर फेरि प्रयास गर्नुहोस्।",
+                "current": self.get_serializer(current).data,
+            },
+            status=status.HTTP_409_CONFLICT,
+        )
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance.status in [Order.Status.COMPLETED, Order.Status.REJECTED]:
@@ -51,25 +166,161 @@ class OrderViewSet(viewsets.ModelViewSet):
         if order.status == Order.Status.CANCELLED:
             return Response({"detail": "अर्डर पहिले नै रद्द गरिएको छ।"}, status=400)
 
-        order.status = Order.Status.CANCELLED
-        order.save()
+        try:
+            expected = int(request.data.get("version", order.version))
+        except (TypeError, ValueError):
+            return Response({"version": "मान्य संख्या हुनुपर्छ।"}, status=400)
+        try:
+            # Fails if, say, staff completed the order after it was read
+            order.compare_and_set(expected, status=Order.Status.CANCELLED)
+        except OrderConflict:
+            return self._conflict(order.pk)
 
         serializer = self.get_serializer(order)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["post"], permission_classes=[IsAdminUser])
+    def bulk(self, request):
+        """Apply status changes, cancellations and price updates to many
+        orders in one transaction; returns a result per operation."""
+        serializer = BulkOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk.apply(serializer.validated_data["operations"])
+        return Response({"results": results})
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """Stream every order matching the list filters with its items.
+
+        ?output=csv (default) or ndjson; ?include_customer=1 adds the
+        customer's UserSerializer fields.
+        """
+        output = request.query_params.get("output", "csv")
+        if output not in EXPORT_FORMATS:
+            return Response({"output": "csv वा ndjson मात्र।"}, status=status.HTTP_400_BAD_REQUEST)
+        include_customer = request.query_params.get("include_customer") in ("1", "true", "True")
+
+        format_class, content_type = EXPORT_FORMATS[output]
+        # Streamed after the view returns, so pin the replica on the queryset
+        queryset = self.filter_queryset(Order.objects.using(replica_alias()))
+        rows = export.rows(request._request, format_class, queryset, include_customer)
+        response = StreamingHttpResponse(rows, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="orders.{output}"'
+        return response
+
     @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    @read_replica()
     def reports(self, request):
-        qs = Order.objects.all()  # admins see all orders
-        total_orders = qs.count()
-        completed = qs.filter(status=Order.Status.COMPLETED).count()
-        rejected = qs.filter(status=Order.Status.REJECTED).count()
-        pending = qs.filter(status=Order.Status.PENDING).count()
-        total_revenue = sum((o.total_price or 0) for o in qs.filter(status=Order.Status.COMPLETED))
-
-        return Response({
-            "कुल अर्डर": total_orders,
-            "पूरा भएको": completed,
-            "अस्वीकृत": rejected,
-            "प्रक्रियामा": pending,
-            "जम्मा आम्दानी": total_revenue,
-        })
+        created_after = request.query_params.get("created_after")
+        created_before = request.query_params.get("created_before")
+        if created_after or created_before:
+            return self._rollup_report(created_after, created_before)
+
+        # admins see all orders; one pass over the table for every figure
+        totals = Order.objects.aggregate(
+            total=Count("id"),
+            **{
+                key: Count("id", filter=Q(status=value))
+                for key, value in self.REPORT_STATUSES.items()
+            },
+            revenue=Sum("total_price", filter=Q(status=Order.Status.COMPLETED)),
+        )
+        return Response(self._report_payload(totals))
+
+    def _rollup_report(self, created_after, created_before):
+        """Same figures for a range of creation days, read from OrderDailyStat."""
+        stats = OrderDailyStat.objects.all()
+        for param, value, lookup in (
+            ("created_after", created_after, "day__gte"),
+            ("created_before", created_before, "day__lte"),
+        ):
+            if not value:
+                continue
+            try:
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                return Response({param: "अमान्य मिति।"}, status=status.HTTP_400_BAD_REQUEST)
+            stats = stats.filter(**{lookup: day})
+
+        completed = Q(status=Order.Status.COMPLETED)
+        totals = stats.filter(appliance="").aggregate(
+            total=Sum("orders"),
+            **{
+                key: Sum("orders", filter=Q(status=value))
+                for key, value in self.REPORT_STATUSES.items()
+            },
+            revenue=Sum("revenue", filter=completed),
+        )
+        appliances = (
+            stats.exclude(appliance="")
+            .values("appliance")
+            .annotate(orders=Sum("orders"), quantity=Sum("quantity"), revenue=Sum("revenue", filter=completed))
+            .order_by("appliance")
+        )
+
+        payload = self._report_payload(totals)
+        payload["उपकरण अनुसार"] = [
+            {**row, "revenue": row["revenue"] or Decimal("0.00")} for row in appliances
+        ]
+        return Response(payload)
+
+    @staticmethod
+    def _report_payload(totals):
+        return {
+            "कुल अर्डर": totals["total"] or 0,
+            "पूरा भएको": totals["completed"] or 0,
+            "अस्वीकृत": totals["rejected"] or 0,
+            "प्रक्रियामा": totals["pending"] or 0,
+            "रद्द गरिएको": totals["cancelled"] or 0,
+            "जम्मा आम्दानी": totals["revenue"] or Decimal("0.00"),
+        }
+
+
+async def _ticket_auth(request):
+    ticket = request.query_params.get("ticket")
+    user = await events.aredeem_ticket(ticket) if ticket else None
+    return (user, None) if user is not None else None
+
+
+@async_api_view(methods=["POST"])
+async def order_events_ticket(request):
+    """A one-time ticket for opening the event stream (see orders/events.py)."""
+    return Response({
+        "ticket": events.issue_ticket(request.user),
+        "expires_in": settings.ORDER_EVENTS_TICKET_SECONDS,
+    })
+
+
+@async_api_view(query_auth=_ticket_auth)
+async def order_events(request):
+    """Server-sent events with the orders changing from now on: the user's
+    own, or every order for staff (see orders/events.py). EventSource can't
+    send headers, so it authenticates with ?ticket=."""
+    subscription = events.get_broker().subscribe(request.user)
+    response = StreamingHttpResponse(events.stream(subscription), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Ask nginx not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# GET on the list and detail URLs is served natively async (see
+# backend/async_views.py); every other method goes to OrderViewSet.
+def _async_viewset(request, action, **kwargs):
+    return OrderViewSet(request=request, action=action, args=(), kwargs=kwargs, format_kwarg=None)
+
+
+@async_api_view(fallback=OrderViewSet.as_view({"get": "list", "post": "create"}))
+async def order_list(request):
+    view = _async_viewset(request, "list")
+    return await view.aconditional(request, view.alist)
+
+
+@async_api_view(fallback=OrderViewSet.as_view({
+    "get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy",
+}))
+async def order_detail(request, pk):
+    view = _async_viewset(request, "retrieve", pk=pk)
+    return await view.aconditional(request, view.aretrieve, pk)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from .models import OutgoingEmail, User
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -24,3 +24,10 @@ class CustomUserAdmin(UserAdmin):
             "fields": ("username", "email", "phone", "address", "password1", "password2", "is_staff", "is_superuser"),
         }),
     )
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status",)
+    readonly_fields = ("created_at", "sent_at", "last_error")
@@ -0,0 +1,124 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from backend import profiling
+
+
+def user_cache_key(user_id):
+    return f"users:auth:{user_id}"
+
+
+def user_version_key(user_id):
+    return f"users:auth:version:{user_id}"
+
+
+def invalidate_user(user_id):
+    """Retire every cached copy of the user by bumping their version."""
+    try:
+        cache.incr(user_version_key(user_id))
+    except ValueError:
+        pass  # no version yet; the next one starts from the clock, so no entry matches it
+
+
+def _cached_user(entries, user_id):
+    entry = entries.get(user_cache_key(user_id))
+    version = entries.get(user_version_key(user_id))
+    if entry is not None and version is not None and entry[0] == version:
+        return entry[1]
+    return None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that looks the user up in the cache before the database.
+
+    Entries are stored as (version, user), and only count while the user's
+    version in the cache is the same. users.signals bumps the version once a
+    save or delete of the user commits, which covers password resets and
+    deactivation. A request that read the row just before the commit stores
+    it under the old version, so the stale copy is never used; deleting the
+    entry instead would let that request put it back. Both keys are read in
+    one round trip.
+
+    The active and revoked-token checks still run on every request, against
+    the cached row.
+    """
+
+    def authenticate(self, request):
+        with profiling.measure("auth"):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        entries = cache.get_many([user_cache_key(user_id), user_version_key(user_id)])
+        user = _cached_user(entries, user_id)
+        if user is None:
+            version = entries.get(user_version_key(user_id))
+            if version is None:
+                cache.add(user_version_key(user_id), time.time_ns(), timeout=None)
+                version = cache.get(user_version_key(user_id))
+            # The version is read before the row, so a change committed in
+            # between leaves this copy under a version that is already gone
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            if version is not None:
+                cache.set(user_cache_key(user_id), (version, user), settings.AUTH_USER_CACHE_TIMEOUT)
+        return self._check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """Async counterpart of authenticate() for plain Django async views."""
+        with profiling.measure("auth"):
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            return await self.aauthenticate_token(raw_token)
+
+    async def aauthenticate_token(self, raw_token):
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        entries = await cache.aget_many([user_cache_key(user_id), user_version_key(user_id)])
+        user = _cached_user(entries, user_id)
+        if user is None:
+            version = entries.get(user_version_key(user_id))
+            if version is None:
+                await cache.aadd(user_version_key(user_id), time.time_ns(), timeout=None)
+                version = await cache.aget(user_version_key(user_id))
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            if version is not None:
+                await cache.aset(user_cache_key(user_id), (version, user), settings.AUTH_USER_CACHE_TIMEOUT)
+        return self._check_user(user, validated_token)
+
+    def _check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,266 @@
+"""Refresh-token blacklist with an in-memory prefilter and batched writes.
+
+simplejwt checks ``BlacklistedToken`` with a database query on every refresh,
+and inserts an ``OutstandingToken`` row on every login and refresh. Here:
+
+- Each process keeps a Bloom filter of the jtis of unexpired blacklisted
+  tokens. A token the filter has never seen is not blacklisted, so the usual
+  refresh costs one cache read and no query; only filter hits (blacklisted
+  tokens plus ~0.1% false positives) are confirmed against the database.
+- Blacklisting bumps a sequence number in the shared cache after the commit,
+  and stores the jti under that number. Other processes notice the new
+  number on their next check and add the jti to their filter; if an entry is
+  missing they reload the filter from the table.
+- ``OutstandingToken`` rows are written in batches from a buffer instead of
+  one INSERT per token. They only serve as an audit list: ``blacklist()``
+  creates the row itself when it hasn't been flushed yet, so a lost buffer
+  never lets a token escape the blacklist. Blacklist rows are still written
+  synchronously.
+
+``manage.py purge_expired_tokens`` removes rows of expired tokens, which keeps
+both the table and the filter bounded. The sequence number has to be seen
+by every worker process, so with a process-local cache (the default
+LocMemCache) the prefilter is skipped and every check queries the table, as
+simplejwt does (see users.checks).
+"""
+import atexit
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from backend import tasks
+
+from .checks import shared_cache
+
+SEQUENCE_KEY = "users:blacklist:seq"
+ENTRY_TIMEOUT = 60 * 60
+# Further behind than this, reloading beats fetching entries one by one
+MAX_CATCH_UP = 1000
+FALSE_POSITIVE_RATE = 0.001
+
+User = get_user_model()
+
+
+def _entry_key(seq):
+    return f"users:blacklist:entry:{seq}"
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class _Prefilter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.seq = None
+        self.loaded_at = 0
+
+    def _reload(self, seq):
+        jtis = list(
+            BlacklistedToken.objects
+            .filter(token__expires_at__gt=timezone.now())
+            .values_list("token__jti", flat=True)
+        )
+        capacity = max(settings.TOKEN_BLACKLIST_FILTER_CAPACITY, 2 * len(jtis))
+        bloom = BloomFilter(capacity)
+        for jti in jtis:
+            bloom.add(jti)
+        self.filter, self.seq, self.loaded_at = bloom, seq, time.monotonic()
+
+    def _catch_up(self, seq):
+        keys = [_entry_key(n) for n in range(self.seq + 1, seq + 1)]
+        entries = cache.get_many(keys)
+        if len(entries) < len(keys):
+            return False
+        for jti in entries.values():
+            self.filter.add(jti)
+        self.seq = seq
+        return True
+
+    def might_contain(self, jti):
+        seq = cache.get(SEQUENCE_KEY)
+        if seq is None:
+            cache.add(SEQUENCE_KEY, time.time_ns(), timeout=None)
+            seq = cache.get(SEQUENCE_KEY)
+        with self.lock:
+            stale = (
+                self.filter is None
+                or seq < self.seq
+                # Rebuild now and then so purged tokens leave the filter
+                or time.monotonic() - self.loaded_at > settings.TOKEN_BLACKLIST_FILTER_REBUILD_SECONDS
+                or self.filter.count > self.filter.capacity
+            )
+            if stale or seq - self.seq > MAX_CATCH_UP or (seq > self.seq and not self._catch_up(seq)):
+                self._reload(seq)
+            return jti in self.filter
+
+    def published(self, seq, jti):
+        with self.lock:
+            if self.filter is not None and seq == self.seq + 1:
+                self.filter.add(jti)
+                self.seq = seq
+
+
+_prefilter = _Prefilter()
+
+
+def _publish(jti):
+    try:
+        seq = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # No sequence yet: every process reloads from the table anyway
+        cache.add(SEQUENCE_KEY, time.time_ns(), timeout=None)
+        return
+    cache.set(_entry_key(seq), jti, ENTRY_TIMEOUT)
+    _prefilter.published(seq, jti)
+
+
+def is_blacklisted(jti):
+    # Other processes can't tell this one about their blacklistings through
+    # a process-local cache, so its filter can't rule anything out
+    if shared_cache() and not _prefilter.might_contain(jti):
+        return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+class _OutstandingBuffer:
+    """Collects OutstandingToken rows and inserts them in one query per batch."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = []
+        self.timer = None
+
+    def add(self, row):
+        with self.lock:
+            self.rows.append(row)
+            full = len(self.rows) >= settings.TOKEN_OUTSTANDING_BATCH_SIZE
+            if not full and self.timer is None and not settings.BACKGROUND_TASKS_EAGER:
+                self.timer = threading.Timer(settings.TOKEN_OUTSTANDING_FLUSH_SECONDS, self._flush_later)
+                self.timer.daemon = True
+                self.timer.start()
+        if full or settings.BACKGROUND_TASKS_EAGER:
+            tasks.enqueue(self.flush)
+
+    def _flush_later(self):
+        tasks.enqueue(self.flush)
+
+    def flush(self):
+        with self.lock:
+            rows, self.rows = self.rows, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not rows:
+            return 0
+        try:
+            with transaction.atomic():
+                OutstandingToken.objects.bulk_create(
+                    rows, batch_size=settings.TOKEN_OUTSTANDING_BATCH_SIZE, ignore_conflicts=True
+                )
+        except IntegrityError:
+            # A user was deleted since the token was issued; keep the rest
+            existing = set(User.objects.filter(pk__in={row.user_id for row in rows}).values_list("pk", flat=True))
+            for row in rows:
+                if row.user_id is not None and int(row.user_id) not in existing:
+                    row.user_id = None
+            OutstandingToken.objects.bulk_create(
+                rows, batch_size=settings.TOKEN_OUTSTANDING_BATCH_SIZE, ignore_conflicts=True
+            )
+        return len(rows)
+
+
+outstanding = _OutstandingBuffer()
+atexit.register(outstanding.flush)
+
+
+class RefreshToken(tokens.RefreshToken):
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        with transaction.atomic():
+            # Usually the row was flushed long ago and the defaults go unused
+            token, _ = OutstandingToken.objects.get_or_create(
+                jti=jti,
+                defaults={
+                    "user": lambda: User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first(),
+                    "created_at": self.current_time,
+                    "token": str(self),
+                    "expires_at": datetime_from_epoch(self.payload["exp"]),
+                },
+            )
+            blacklisted = BlacklistedToken.objects.get_or_create(token=token)
+            transaction.on_commit(lambda: _publish(jti))
+        return blacklisted
+
+    def outstand(self):
+        outstanding.add(OutstandingToken(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            user_id=self.payload.get(api_settings.USER_ID_CLAIM),
+            created_at=self.current_time,
+            token=str(self),
+            expires_at=datetime_from_epoch(self.payload["exp"]),
+        ))
+
+    @classmethod
+    def for_user(cls, user):
+        # Skip BlacklistMixin.for_user and its INSERT; queue the row instead
+        token = super(tokens.BlacklistMixin, cls).for_user(user)
+        token.outstand()
+        return token
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+    def validate(self, attrs):
+        token = tokens.UntypedToken(attrs["token"])
+        if is_blacklisted(token.get(api_settings.JTI_CLAIM)):
+            raise ValidationError(_("Token is blacklisted"))
+        return {}
@@ -0,0 +1,33 @@
+"""System checks for settings the users app relies on."""
+from django.conf import settings
+from django.core import checks
+
+# Caches whose contents no other worker process sees
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def shared_cache():
+    """Whether the default cache is the same for every worker process."""
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if shared_cache():
+        return []
+    return [
+        checks.Warning(
+            "The default cache is local to each process.",
+            hint=(
+                "Fine with a single worker process. With more, set CACHE_BACKEND "
+                "to a shared cache (Redis, Memcached): until then the refresh-token "
+                "blacklist skips its prefilter and queries the database every time, and a "
+                "user changed in one process stays cached in the others for up to "
+                "AUTH_USER_CACHE_TIMEOUT."
+            ),
+            id="users.W001",
+        )
+    ]
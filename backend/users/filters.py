@@ -0,0 +1,98 @@
+from datetime import datetime, time
+
+from django.db.models import Count, Exists, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from backend import search
+from orders.models import Order
+
+
+def wants_stats(request):
+    return request.query_params.get("stats") in ("1", "true", "True")
+
+
+def with_order_stats(queryset):
+    """Annotate ``order_count`` and ``last_order_at`` (NULL without orders).
+
+    Correlated subqueries on order_customer_status_idx rather than a join with
+    GROUP BY, so they combine with search and keyset pagination unchanged.
+    """
+    orders = Order.objects.filter(customer=OuterRef("pk")).order_by().values("customer")
+    return queryset.annotate(
+        order_count=Coalesce(
+            Subquery(orders.annotate(n=Count("id")).values("n"), output_field=IntegerField()), Value(0)
+        ),
+        last_order_at=Subquery(orders.annotate(last=Max("created_at")).values("last")),
+    )
+
+
+class UserFilterBackend(BaseFilterBackend):
+    """Server-side filters for the customer and staff lists.
+
+    ?q=<words>                  full-text search (backend/search.py), best matches first
+    ?joined_after=<date>&joined_before=<date>
+    ?has_orders=true|false      only users with (or without) orders
+    ?stats=true                 add order_count and last_order_at to each user
+    ?ordering=<field>           -date_joined (default), date_joined, username,
+                                -username, order_count, -order_count
+    """
+
+    ORDERINGS = {
+        "-date_joined": ("-date_joined", "-id"),
+        "date_joined": ("date_joined", "id"),
+        "username": ("username",),
+        "-username": ("-username",),
+        "order_count": ("order_count", "id"),
+        "-order_count": ("-order_count", "-id"),
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        for param, lookup, end_of_day in (
+            ("joined_after", "date_joined__gte", False),
+            ("joined_before", "date_joined__lte", True),
+        ):
+            if params.get(param):
+                queryset = queryset.filter(**{lookup: self._parse_day(params[param], param, end_of_day)})
+
+        has_orders = params.get("has_orders")
+        if has_orders:
+            if has_orders not in ("true", "false"):
+                raise ValidationError({"has_orders": "true वा false हुनुपर्छ।"})
+            orders = Exists(Order.objects.filter(customer=OuterRef("pk")))
+            queryset = queryset.filter(orders if has_orders == "true" else ~orders)
+
+        # Ordering by order_count needs the annotation even without ?stats
+        ordering = self.get_ordering(request, queryset, view)
+        if wants_stats(request) or "order_count" in {field.lstrip("-") for field in ordering}:
+            queryset = with_order_stats(queryset)
+
+        q = params.get("q")
+        if search.has_terms(q):
+            queryset = queryset.filter(search__body__match=q).annotate(search_rank=search.Rank("search__body", q))
+
+        return queryset
+
+    def get_ordering(self, request, queryset, view):
+        """Used by KeysetPagination; search results go by relevance."""
+        if search.has_terms(request.query_params.get("q")):
+            return ("search_rank", "id")
+        ordering = request.query_params.get("ordering") or "-date_joined"
+        if ordering not in self.ORDERINGS:
+            raise ValidationError({"ordering": f"अमान्य क्रम: {ordering}"})
+        return self.ORDERINGS[ordering]
+
+    @staticmethod
+    def _parse_day(value, param, end_of_day):
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({param: "अमान्य मिति।"})
+        return timezone.make_aware(datetime.combine(day, time.max if end_of_day else time.min))
@@ -0,0 +1,37 @@
+"""Password checks off the event loop, on a dedicated bounded thread pool.
+
+PBKDF2 is deliberately slow CPU work. Run inline it would stall the event
+loop, and on Django's shared executors it would compete with every other
+sync_to_async call. PASSWORD_HASHING_WORKERS caps how many hashes one
+process computes at once; further logins wait in the pool's queue.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib import auth
+from django.db import close_old_connections
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_WORKERS,
+    thread_name_prefix="password-hashing",
+)
+
+
+def _authenticate(request, credentials):
+    # Pool threads outlive requests; treat each call like one for connections
+    close_old_connections()
+    try:
+        return auth.authenticate(request, **credentials)
+    finally:
+        close_old_connections()
+
+
+async def authenticate(request, **credentials):
+    """django.contrib.auth.authenticate on the pool above.
+
+    AUTHENTICATION_BACKENDS, the user_login_failed signal and ModelBackend's
+    own handling (the dummy hash for unknown usernames, inactive users,
+    upgrading outdated hashes) all apply, as with a sync login view.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_executor, _authenticate, request, credentials)
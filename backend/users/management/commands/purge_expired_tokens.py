@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from users.blacklist import outstanding
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete outstanding and blacklisted refresh tokens that have expired, "
+        "walking the table in primary-key ranges so each delete is short."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows examined per delete.")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        pause = options["sleep"]
+        outstanding.flush()
+
+        cutoff = timezone.now()
+        last = OutstandingToken.objects.aggregate(last=Max("pk"))["last"] or 0
+        deleted = 0
+        start = 0
+        while start < last:
+            # Ranges on the primary key use its index; expires_at has none
+            expired = list(
+                OutstandingToken.objects
+                .filter(pk__gt=start, pk__lte=start + chunk_size, expires_at__lte=cutoff)
+                .values_list("pk", flat=True)
+            )
+            if expired:
+                BlacklistedToken.objects.filter(token_id__in=expired).delete()
+                OutstandingToken.objects.filter(pk__in=expired).delete()
+                deleted += len(expired)
+            start += chunk_size
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired token(s)."))
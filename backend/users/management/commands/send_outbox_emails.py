@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from users import outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued emails that are due, e.g. after a restart lost the in-process queue."
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            count = outbox.deliver()
+            total += count
+            if count == 0:
+                break
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} email(s)."))
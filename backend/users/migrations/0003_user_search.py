@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:43
+
+import backend.search
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_index(apps, schema_editor):
+    backend.search.create_table(schema_editor, "users_user_fts", "users_user")
+
+
+def drop_index(apps, schema_editor):
+    backend.search.drop_table(schema_editor, "users_user_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearch',
+            fields=[
+                ('user', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('body', backend.search.SearchTextField()),
+            ],
+            options={
+                'db_table': 'users_user_fts',
+                'managed': False,
+            },
+        ),
+        # Fill it with manage.py rebuild_search_index
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,9 +1,62 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+
+from backend.search import SearchTextField
 
 class User(AbstractUser):
     phone = models.CharField(max_length=20, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Customer and staff lists: is_staff filter, newest first
+            models.Index(fields=["is_staff", "date_joined", "id"], name="user_staff_joined_idx"),
+        ]
+
     def __str__(self):
         return self.username
+
+
+class OutgoingEmail(models.Model):
+    """Email waiting in the outbox; written in the sender's transaction and
+    delivered afterwards by users.outbox."""
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'पठाउन बाँकी'
+        SENT = 'SENT', 'पठाइएको'
+        FAILED = 'FAILED', 'असफल'
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)}"
+
+
+class UserSearch(models.Model):
+    """Row of the customer full-text index (see backend/search.py), kept in
+    sync by users.signals."""
+
+    user = models.OneToOneField(
+        User, primary_key=True, db_column="rowid", on_delete=models.DO_NOTHING, related_name="search"
+    )
+    body = SearchTextField()
+
+    class Meta:
+        managed = False
+        db_table = "users_user_fts"
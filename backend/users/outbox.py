@@ -0,0 +1,155 @@
+"""Transactional email outbox.
+
+``enqueue`` only inserts an OutgoingEmail row, inside the caller's
+transaction, so a request never waits for SMTP and a rolled-back request
+sends nothing. Once the transaction commits, a background task delivers
+everything that is due over one reused SMTP connection. Failed messages are
+retried with exponential backoff and marked FAILED after
+OUTBOX_MAX_ATTEMPTS. ``manage.py send_outbox_emails`` delivers whatever a
+restart left behind.
+
+Anything that sends mail (password resets, order status notifications)
+should go through ``enqueue`` rather than ``send_mail``.
+"""
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from backend import tasks
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+# A claimed batch not finished within this time is picked up again
+CLAIM_SECONDS = 300
+
+_lock = threading.Lock()
+_queued = False
+_retry_timer = None
+
+
+def enqueue(subject, message, recipient_list, from_email=None):
+    email = OutgoingEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipient_list),
+    )
+    transaction.on_commit(schedule)
+    return email
+
+
+def schedule():
+    """Queue one delivery run, unless one is already waiting."""
+    global _queued
+    with _lock:
+        if _queued:
+            return
+        _queued = True
+    tasks.enqueue(_drain)
+
+
+def _drain():
+    global _queued
+    with _lock:
+        # Cleared first: mail committed from here on queues a new run
+        _queued = False
+    while deliver() == settings.OUTBOX_BATCH_SIZE:
+        pass
+    _schedule_retry()
+
+
+def _schedule_retry():
+    global _retry_timer
+    next_attempt = (
+        OutgoingEmail.objects.filter(status=OutgoingEmail.Status.PENDING)
+        .order_by("next_attempt_at").values_list("next_attempt_at", flat=True).first()
+    )
+    if next_attempt is None or settings.BACKGROUND_TASKS_EAGER:
+        return
+    with _lock:
+        if _retry_timer is not None:
+            _retry_timer.cancel()
+        delay = max((next_attempt - timezone.now()).total_seconds(), 0)
+        _retry_timer = threading.Timer(delay, schedule)
+        _retry_timer.daemon = True
+        _retry_timer.start()
+
+
+def _claim(now):
+    """Mark up to OUTBOX_BATCH_SIZE due messages as ours.
+
+    The UPDATE re-checks that each row is still due, so when two workers
+    race for the same rows only one of them gets each row.
+    """
+    claim = uuid.uuid4().hex
+    due = list(
+        OutgoingEmail.objects
+        .filter(status=OutgoingEmail.Status.PENDING, next_attempt_at__lte=now)
+        .order_by("next_attempt_at")
+        .values_list("pk", flat=True)[:settings.OUTBOX_BATCH_SIZE]
+    )
+    OutgoingEmail.objects.filter(
+        pk__in=due, status=OutgoingEmail.Status.PENDING, next_attempt_at__lte=now
+    ).update(claim=claim, next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS))
+    return list(OutgoingEmail.objects.filter(claim=claim).order_by("pk"))
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(
+        settings.OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1), settings.OUTBOX_MAX_RETRY_SECONDS
+    ))
+
+
+def deliver():
+    """Send one batch of due messages; returns how many were claimed."""
+    emails = _claim(timezone.now())
+    if not emails:
+        return 0
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning("Could not connect to the mail server", exc_info=True)
+        for email in emails:
+            _failed(email, exc)
+    else:
+        try:
+            for email in emails:
+                message = EmailMessage(email.subject, email.body, email.from_email, email.to, connection=connection)
+                try:
+                    connection.send_messages([message])
+                except Exception as exc:
+                    logger.warning("Could not send email %s", email.pk, exc_info=True)
+                    _failed(email, exc)
+                else:
+                    email.status = OutgoingEmail.Status.SENT
+                    email.sent_at = timezone.now()
+                    email.attempts += 1
+                    email.last_error = ""
+        finally:
+            connection.close()
+
+    for email in emails:
+        email.claim = ""
+    OutgoingEmail.objects.bulk_update(
+        emails, ["status", "attempts", "next_attempt_at", "claim", "last_error", "sent_at"]
+    )
+    return len(emails)
+
+
+def _failed(email, exc):
+    email.attempts += 1
+    email.last_error = f"{type(exc).__name__}: {exc}"
+    if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.Status.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + _backoff(email.attempts)
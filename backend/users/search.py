@@ -0,0 +1,34 @@
+"""Keeps the customer full-text index (UserSearch) in step with users."""
+from django.db import transaction
+
+from backend import tasks
+
+from .models import User, UserSearch
+
+BATCH_SIZE = 500
+
+
+def document(user):
+    return " ".join(part for part in (user.username, user.phone, user.address) if part)
+
+
+def schedule(user_id):
+    transaction.on_commit(lambda: tasks.enqueue(reindex, [user_id]))
+
+
+def reindex(user_ids):
+    """Rewrite the index rows of ``user_ids``; deleted users lose theirs."""
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        users = User.objects.filter(pk__in=batch).only("username", "phone", "address")
+        with transaction.atomic():
+            UserSearch.objects.filter(user_id__in=batch).delete()
+            UserSearch.objects.bulk_create([UserSearch(user_id=user.pk, body=document(user)) for user in users])
+
+
+def rebuild():
+    """Index every user from scratch."""
+    UserSearch.objects.all().delete()
+    user_ids = list(User.objects.order_by("pk").values_list("pk", flat=True))
+    reindex(user_ids)
+    return len(user_ids)
@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
 from .models import User
 from django.contrib.auth.password_validation import validate_password
 
@@ -8,7 +7,17 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "email", "phone", "address", "is_staff"]
-        
+
+
+# With ?stats=true on the customer/staff lists (users/filters.py annotates these)
+class UserStatsSerializer(UserSerializer):
+    order_count = serializers.IntegerField(read_only=True)
+    last_order_at = serializers.DateTimeField(read_only=True)
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ["order_count", "last_order_at"]
+
+
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -28,16 +37,11 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
     
     
+# Credentials are checked by users.views.login, off the event loop (users/hashing.py)
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
-    def validate(self, data):
-        user = authenticate(**data)
-        if user and user.is_active:
-            return user
-        raise serializers.ValidationError({"detail": "Invalid credentials"})
-
 
 class ForgotPasswordSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -0,0 +1,26 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import search
+from .authentication import invalidate_user
+from .models import User
+
+# Fields that make up a user's search text, here and in the order index
+SEARCH_FIELDS = {"username", "phone", "address"}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    # Only after the commit: a request before it would just reload the old row
+    transaction.on_commit(partial(invalidate_user, instance.pk))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def reindex_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        search.schedule(instance.pk)
@@ -1,3 +1,302 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from smtplib import SMTPException
 
-# Create your tests here.
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_login_failed
+from django.core import checks, mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from orders.models import Order
+
+from .authentication import user_cache_key, user_version_key
+from . import outbox
+from .blacklist import RefreshToken, is_blacklisted
+from .filters import UserFilterBackend
+from .models import OutgoingEmail, User
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class BlacklistTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ram", password="pw-Strong-123")
+        self.client = APIClient()
+
+    def blacklist_elsewhere(self, refresh):
+        """Blacklist as another worker process would: the row, but no cache
+        entry this process could learn it from."""
+        token = OutstandingToken.objects.get(jti=refresh["jti"])
+        BlacklistedToken.objects.create(token=token)
+
+    def test_blacklisted_in_another_process(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.assertFalse(is_blacklisted(refresh["jti"]))  # loads the prefilter
+        self.blacklist_elsewhere(refresh)
+
+        response = self.client.post("/api/token/refresh/", {"refresh": str(refresh)}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout(self):
+        refresh = RefreshToken.for_user(self.user)
+        response = self.client.post("/api/logout/", {"refresh": str(refresh)}, format="json")
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post("/api/token/refresh/", {"refresh": str(refresh)}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+
+class ShopBackend(ModelBackend):
+    """Logs in with the phone number as well as the username."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = User.objects.filter(phone=username).first()
+        if user and user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class LoginTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="ram", password="pw-Strong-123", phone="9800000000")
+        self.client = APIClient()
+
+    def login(self, username, password="pw-Strong-123"):
+        return self.client.post("/api/login/", {"username": username, "password": password}, format="json")
+
+    def test_login(self):
+        response = self.login("ram")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["user"]["username"], "ram")
+        self.assertIn("access", response.data)
+
+    def test_failed_login_is_signalled(self):
+        failures = []
+
+        def receiver(sender, credentials, request, **kwargs):
+            failures.append((credentials["username"], request.path))
+
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        self.assertEqual(self.login("ram", "wrong").status_code, 400)
+        self.assertEqual(self.login("nobody").status_code, 400)
+        self.assertEqual(failures, [("ram", "/api/login/"), ("nobody", "/api/login/")])
+
+    def test_inactive_user(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.login("ram").status_code, 400)
+
+    @override_settings(AUTHENTICATION_BACKENDS=["users.tests.ShopBackend"])
+    def test_authentication_backends(self):
+        self.assertEqual(self.login("9800000000").status_code, 200)
+        self.assertEqual(self.login("ram").status_code, 400)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CachedUserTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ram", password="pw-Strong-123")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def me(self):
+        return self.client.get("/api/user/me/").status_code
+
+    def test_cached_until_saved(self):
+        self.assertEqual(self.me(), 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me(), 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me(), 401)
+
+    def test_copy_read_before_commit_is_not_used(self):
+        self.assertEqual(self.me(), 200)
+        version = cache.get(user_version_key(self.user.pk))
+        stale = User.objects.get(pk=self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        # A request that loaded the row before the commit stores it late
+        cache.set(user_cache_key(self.user.pk), (version, stale))
+        self.assertEqual(self.me(), 401)
+
+
+class SharedCacheCheckTests(TestCase):
+    def run_check(self):
+        return [message.id for message in checks.run_checks(tags=[checks.Tags.caches])]
+
+    def test_process_local_cache(self):
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            self.assertIn("users.W001", self.run_check())
+
+    def test_shared_cache(self):
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}):
+            self.assertNotIn("users.W001", self.run_check())
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CustomerListTests(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="boss", is_staff=True))
+        names = ["mina", "hari", "sita", "anil", "bina", "gita"]
+        self.users = [User.objects.create_user(username=name) for name in names]
+        # Ties on date_joined and on order_count
+        joined = timezone.make_aware(datetime(2026, 1, 10, 12))
+        User.objects.filter(pk__in=[user.pk for user in self.users[:4]]).update(date_joined=joined)
+        User.objects.filter(pk__in=[user.pk for user in self.users[4:]]).update(date_joined=joined + timedelta(days=1))
+        self.order_counts = dict(zip(names, [2, 0, 2, 1, 0, 2]))
+        for user in self.users:
+            for _ in range(self.order_counts[user.username]):
+                Order.objects.create(customer=user)
+
+    def walk(self, ordering):
+        """Usernames on every page following the next links, then the same
+        pages read back through the previous links."""
+        pages = [self.client.get("/api/users/customers/", {"ordering": ordering, "page_size": 2}).data]
+        while pages[-1]["next"]:
+            pages.append(self.client.get(pages[-1]["next"]).data)
+        forward = [row["username"] for page in pages for row in page["results"]]
+        page, backward = pages[-1], [row["username"] for row in pages[-1]["results"]]
+        while page["previous"]:
+            page = self.client.get(page["previous"]).data
+            backward[:0] = [row["username"] for row in page["results"]]
+        return forward, backward
+
+    def test_each_ordering(self):
+        users = User.objects.filter(is_staff=False)
+        keys = {
+            "date_joined": lambda user: (user.date_joined, user.pk),
+            "username": lambda user: user.username,
+            "order_count": lambda user: (self.order_counts[user.username], user.pk),
+        }
+        for ordering in UserFilterBackend.ORDERINGS:
+            with self.subTest(ordering=ordering):
+                key = keys[ordering.lstrip("-")]
+                expected = [user.username for user in sorted(users, key=key, reverse=ordering.startswith("-"))]
+                self.assertEqual(self.walk(ordering), (expected, expected))
+
+    def test_unknown_ordering(self):
+        response = self.client.get("/api/users/customers/", {"ordering": "password"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CountingBackend(EmailBackend):
+    """Local stand-in for the SMTP server that counts its connections."""
+
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException("451 try again later")
+
+
+class UnreachableBackend(EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError("connection refused")
+
+
+@override_settings(
+    BACKGROUND_TASKS_EAGER=True,
+    EMAIL_BACKEND="users.tests.CountingBackend",
+    OUTBOX_BATCH_SIZE=100,
+    OUTBOX_MAX_ATTEMPTS=3,
+    OUTBOX_RETRY_SECONDS=30,
+    OUTBOX_MAX_RETRY_SECONDS=3600,
+)
+class OutboxTests(TransactionTestCase):
+    def setUp(self):
+        CountingBackend.opened = 0
+
+    def queue(self, count=1):
+        with transaction.atomic():
+            return [outbox.enqueue(f"Subject {n}", "Body", [f"user{n}@example.com"]) for n in range(count)]
+
+    def make_due(self):
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+
+    def test_batch_over_one_connection(self):
+        self.queue(3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.Status.SENT, claim="").count(), 3)
+
+    def test_rolled_back_request_sends_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            outbox.enqueue("Subject", "Body", ["ram@example.com"])
+            raise RuntimeError
+        self.assertEqual(OutgoingEmail.objects.count(), 0)
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(OUTBOX_BATCH_SIZE=2)
+    def test_claims_do_not_overlap(self):
+        # Rows only, without the delivery run enqueue() would start
+        OutgoingEmail.objects.bulk_create(
+            OutgoingEmail(subject="Subject", body="Body", from_email="shop@example.com", to=["ram@example.com"])
+            for _ in range(3)
+        )
+        now = timezone.now()
+        first = outbox._claim(now)
+        second = outbox._claim(now)
+        self.assertEqual((len(first), len(second)), (2, 1))
+        self.assertFalse({email.pk for email in first} & {email.pk for email in second})
+        # Claimed rows are no longer due for anyone else
+        self.assertEqual(outbox._claim(now), [])
+        self.assertEqual(outbox.deliver(), 0)
+
+    @override_settings(EMAIL_BACKEND="users.tests.FailingBackend")
+    def test_retry_with_backoff(self):
+        with self.assertLogs("users.outbox", "WARNING"):
+            [email] = self.queue()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.Status.PENDING, 1))
+        self.assertIn("451", email.last_error)
+        self.assertAlmostEqual(
+            (email.next_attempt_at - timezone.now()).total_seconds(), 30, delta=5
+        )
+        self.assertEqual(outbox.deliver(), 0)  # not due yet
+
+        self.make_due()
+        with self.assertLogs("users.outbox", "WARNING"):
+            outbox.deliver()
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertAlmostEqual(
+            (email.next_attempt_at - timezone.now()).total_seconds(), 60, delta=5
+        )
+
+        self.make_due()
+        with self.assertLogs("users.outbox", "WARNING"):
+            outbox.deliver()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.Status.FAILED, 3))
+
+    def test_backoff_is_capped(self):
+        with self.settings(OUTBOX_MAX_RETRY_SECONDS=100):
+            self.assertEqual(outbox._backoff(1), timedelta(seconds=30))
+            self.assertEqual(outbox._backoff(10), timedelta(seconds=100))
+
+    @override_settings(EMAIL_BACKEND="users.tests.UnreachableBackend")
+    def test_unreachable_server(self):
+        with self.assertLogs("users.outbox", "WARNING"):
+            self.queue(2)
+        self.assertEqual(
+            list(OutgoingEmail.objects.values_list("status", "attempts")),
+            [(OutgoingEmail.Status.PENDING, 1)] * 2,
+        )
+        with self.settings(EMAIL_BACKEND="users.tests.CountingBackend"):
+            self.make_due()
+            outbox.deliver()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(OutgoingEmail.objects.exclude(status=OutgoingEmail.Status.SENT).exists())
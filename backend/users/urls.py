@@ -1,11 +1,11 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
-from .views import RegisterView, LoginView, LogoutView, CustomerListView, StaffListView, current_user, ForgotPasswordView, ResetPasswordView
+from .views import RegisterView, login, LogoutView, CustomerListView, StaffListView, UserCountsView, current_user, ForgotPasswordView, ResetPasswordView
 
 urlpatterns = [
     # Auth
     path("register/", RegisterView.as_view(), name="register"),
-    path("login/", LoginView.as_view(), name="login"), # Custom login view
+    path("login/", login, name="login"), # Custom login view
     path("logout/", LogoutView.as_view(), name="logout"),
     path("user/me/", current_user, name="current-user"),
     path("forgot-password/", ForgotPasswordView.as_view(), name="forgot-password"),
@@ -19,4 +19,5 @@ urlpatterns = [
     # Admin-only user lists
     path("users/customers/", CustomerListView.as_view(), name="customer-list"),
     path("users/staff/", StaffListView.as_view(), name="staff-list"),
+    path("users/counts/", UserCountsView.as_view(), name="user-counts"),
 ]
@@ -1,21 +1,26 @@
-from rest_framework import generics, status
+from asgiref.sync import sync_to_async
+from rest_framework import generics, serializers, status
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.permissions import AllowAny, IsAdminUser
+from .blacklist import RefreshToken
 from .models import User
-from .serializers import RegisterSerializer, UserSerializer, LoginSerializer, ResetPasswordSerializer
+from .serializers import RegisterSerializer, UserSerializer, UserStatsSerializer, LoginSerializer, ResetPasswordSerializer
 from rest_framework.generics import ListAPIView
-from rest_framework.decorators import api_view, permission_classes
 from rest_framework.views import APIView
 from .serializers import ForgotPasswordSerializer
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
-from django.core.mail import send_mail
 from django.utils.http import urlsafe_base64_decode
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+from backend.async_views import async_api_view
+from backend.pagination import KeysetPagination
+from backend.routers import replica_alias
+from .filters import UserFilterBackend, wants_stats
+from . import hashing, outbox
 
 
 # Register endpoint
@@ -26,24 +31,23 @@ class RegisterView(generics.CreateAPIView):
 
 
 # Custom Login using simplejwt
-class LoginView(generics.GenericAPIView):
-    serializer_class = LoginSerializer
-    permission_classes = [AllowAny]
-
-    def post(self, request):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        user = serializer.validated_data
+@async_api_view(methods=["POST"], authenticated=False)
+async def login(request):
+    serializer = LoginSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    user = await hashing.authenticate(request._request, **serializer.validated_data)
+    if user is None:
+        raise serializers.ValidationError({"detail": ["Invalid credentials"]})
 
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
-        access_token = str(refresh.access_token)
+    # Generate JWT tokens (queuing the outstanding-token row may touch the DB)
+    refresh = await sync_to_async(RefreshToken.for_user)(user)
+    access_token = str(refresh.access_token)
 
-        return Response({
-            "user": UserSerializer(user).data,
-            "access": access_token,
-            "refresh": str(refresh),
-        }, status=status.HTTP_200_OK)
+    return Response({
+        "user": UserSerializer(user).data,
+        "access": access_token,
+        "refresh": str(refresh),
+    }, status=status.HTTP_200_OK)
 
 
 # Logout (blacklist refresh token)
@@ -63,50 +67,52 @@ class LogoutView(generics.GenericAPIView):
             return Response({"detail": "Invalid token"}, status=status.HTTP_400_BAD_REQUEST)
 
 
-# Customers endpoint (admin only)
-class CustomerListView(ListAPIView):
-    serializer_class = UserSerializer
+# Customer and staff lists (admin only): filters, ordering and search in
+# users/filters.py, one keyset page at a time
+class UserListView(ListAPIView):
     permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
+    filter_backends = [UserFilterBackend]
+    is_staff = None
 
     def get_queryset(self):
-        return User.objects.filter(is_staff=False)
+        return (
+            User.objects.using(replica_alias())
+            .filter(is_staff=self.is_staff)
+            .only(*UserSerializer.Meta.fields, "date_joined")
+        )
 
+    def get_serializer_class(self):
+        return UserStatsSerializer if wants_stats(self.request) else UserSerializer
 
-# Staff endpoint (admin only)
-class StaffListView(ListAPIView):
-    serializer_class = UserSerializer
-    permission_classes = [IsAdminUser]
 
-    def get_queryset(self):
-        return User.objects.filter(is_staff=True)
+class CustomerListView(UserListView):
+    is_staff = False
+
+
+class StaffListView(UserListView):
+    is_staff = True
+
 
+# Head counts for the dashboard, without paging through the lists
+class UserCountsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        counts = User.objects.using(replica_alias()).aggregate(
+            customers=Count("id", filter=Q(is_staff=False)),
+            staff=Count("id", filter=Q(is_staff=True)),
+        )
+        return Response(counts)
 
 
 User = get_user_model()
 
 # Get currently authenticated user
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def current_user(request):
-    try:
-        # Normal case: access token valid
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
-
-    except TokenError:
-        # Access token expired; try refresh
-        refresh_token = request.headers.get("x-refresh-token") or request.COOKIES.get("refresh_token")
-        if refresh_token:
-            try:
-                refresh = RefreshToken(refresh_token)
-                access = str(refresh.access_token)
-                user = User.objects.get(pk=refresh["user_id"])
-                serializer = UserSerializer(user)
-                return Response({"user": serializer.data, "access": access})
-            except (TokenError, User.DoesNotExist):
-                return Response({"detail": "Invalid or expired token"}, status=401)
-        else:
-            return Response({"detail": "Authentication credentials were not provided"}, status=401)
+@async_api_view()
+async def current_user(request):
+    serializer = UserSerializer(request.user)
+    return Response(serializer.data)
 
 
 class ForgotPasswordView(APIView):
@@ -132,8 +138,8 @@ class ForgotPasswordView(APIView):
         # Create frontend reset URL (frontend should handle JWT verification)
         reset_url = f"http://localhost:5173/reset-password/{uid}/{access_token}/"
 
-        # Send email
-        send_mail(
+        # Queue the email; it is sent in the background (users/outbox.py)
+        outbox.enqueue(
             subject="पासवर्ड रिसेट गर्नुहोस्",
             message=f"पासवर्ड रिसेट गर्न यस लिंकमा क्लिक गर्नुहोस्:\n{reset_url}",
             from_email=settings.EMAIL_HOST_USER,
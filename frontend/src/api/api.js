@@ -75,9 +75,68 @@ export const getUserProfile = () => api.get("/user/me/");
 export const placeOrder = (formData) =>
   api.post("/orders/", formData, { headers: { "Content-Type": "multipart/form-data" } });
 
-export const getOrders = () => api.get("/orders/");
+// Orders are cursor-paginated: { next, previous, results }
+export const getOrders = (params) => api.get("/orders/", { params });
+export const getOrdersPage = (url) => api.get(url);
+
+// Follows `next` links; only for pages that really need every order
+export const getAllOrders = async (params) => {
+  const orders = [];
+  let res = await getOrders({ page_size: 100, ...params });
+  orders.push(...res.data.results);
+  while (res.data.next) {
+    res = await getOrdersPage(res.data.next);
+    orders.push(...res.data.results);
+  }
+  return orders;
+};
+// Server-sent order changes; returns a function that closes the stream.
+// onChange gets { id, status, total_price, updated_at, version, customer },
+// onDelete gets { id, customer }. Events may arrive out of order; compare
+// versions before applying one.
+export const subscribeToOrders = (onChange, onDelete) => {
+  let source = null;
+  let timer = null;
+  let closed = false;
+
+  const retry = () => {
+    if (!closed) timer = setTimeout(connect, 5000);
+  };
+
+  // EventSource can't send the token, so it opens the stream with a
+  // one-time ticket instead
+  const connect = async () => {
+    try {
+      const res = await api.post("/orders/events/ticket/");
+      if (closed) return;
+      source = new EventSource(
+        `${api.defaults.baseURL}/orders/events/?ticket=${encodeURIComponent(res.data.ticket)}`
+      );
+      source.addEventListener("order", (e) => onChange(JSON.parse(e.data)));
+      if (onDelete) source.addEventListener("order_deleted", (e) => onDelete(JSON.parse(e.data)));
+      source.onerror = () => {
+        // The ticket is used up; reconnect with a new one instead of
+        // letting EventSource retry the same URL
+        source.close();
+        retry();
+      };
+    } catch (err) {
+      retry();
+    }
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(timer);
+    if (source) source.close();
+  };
+};
+
 export const updateOrder = (id, formData) =>
   api.put(`/orders/${id}/`, formData, { headers: { "Content-Type": "multipart/form-data" } });
-export const cancelOrder = (orderId) => api.post(`/orders/${orderId}/cancel/`);
+// version: the order's version as shown; 409 if it has changed since
+export const cancelOrder = (orderId, version) =>
+  api.post(`/orders/${orderId}/cancel/`, version === undefined ? {} : { version });
 
 export default api;
@@ -6,7 +6,7 @@ function OrderDetails({ order, onClose }) {
   const allImages = useMemo(() => {
     const imgs = [];
     (order.items || []).forEach((item) => {
-      (item.images || []).forEach((img) => imgs.push(img.image));
+      (item.images || []).forEach((img) => imgs.push(img.medium || img.image));
     });
     return imgs;
   }, [order]);
@@ -87,11 +87,11 @@ function OrderDetails({ order, onClose }) {
               {item.images && item.images.length > 0 && (
                 <div className="flex flex-wrap gap-2 mt-3">
                   {item.images.map((img, idx) => {
-                    const imageIndex = allImages.indexOf(img.image);
+                    const imageIndex = allImages.indexOf(img.medium || img.image);
                     return (
                       <img
                         key={img.id}
-                        src={img.image}
+                        src={img.thumbnail || img.image}
                         alt="order item"
                         className="w-24 h-24 object-cover border rounded-lg shadow-sm cursor-pointer hover:ring-2 hover:ring-rose-400"
                         onClick={() => openLightbox(imageIndex)}
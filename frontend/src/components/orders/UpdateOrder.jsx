@@ -68,6 +68,8 @@ function UpdateOrder({ order, onClose, onOrderUpdated }) {
       }));
 
       formData.append("items_payload", JSON.stringify(payload));
+      // The edit is based on this version; 409 if the order changed meanwhile
+      if (order.version !== undefined) formData.append("version", order.version);
 
       items.forEach((item, idx) => {
         Array.from(item.new_files || []).forEach((file) => {
@@ -81,6 +83,11 @@ function UpdateOrder({ order, onClose, onOrderUpdated }) {
     } catch (err) {
       const data = err.response?.data;
       console.error("Order update failed:", data || err.message);
+      if (err.response?.status === 409) {
+        setError(data.detail);
+        onOrderUpdated();  // reload, so the next attempt starts from the current order
+        return;
+      }
       setError(typeof data === "object" ? JSON.stringify(data) : String(data || err.message));
     } finally {
       setSubmitting(false);
@@ -160,7 +167,7 @@ function UpdateOrder({ order, onClose, onOrderUpdated }) {
                 <div className="flex flex-wrap gap-2 mt-2">
                   {item.images.map((img) => (
                     <div key={img.id} className="relative w-24 h-24 border rounded-lg overflow-hidden shadow-sm">
-                      <img src={img.image} alt="existing" className="w-full h-full object-cover" />
+                      <img src={img.thumbnail || img.image} alt="existing" className="w-full h-full object-cover" />
                       <button
                         type="button"
                         onClick={() => handleRemoveExistingImage(idx, img.id)}
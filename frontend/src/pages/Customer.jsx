@@ -4,28 +4,69 @@ import api from "../api/api";
 function CustomerPage() {
   const [customers, setCustomers] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [search, setSearch] = useState("");
+  const [ordering, setOrdering] = useState("-date_joined");
+  const [nextUrl, setNextUrl] = useState(null);
 
   useEffect(() => {
     const fetchCustomers = async () => {
       try {
-        const response = await api.get("users/customers/");
-        setCustomers(response.data);
+        // Order counts and last order dates come with the page (?stats)
+        const params = { stats: true, ordering };
+        if (search.trim()) params.q = search.trim();
+        const response = await api.get("users/customers/", { params });
+        setCustomers(response.data.results);
+        setNextUrl(response.data.next);
       } catch (err) {
         console.error(err);
       } finally {
         setLoading(false);
       }
     };
-    fetchCustomers();
-  }, []);
+    // Wait for a pause in typing before searching
+    const timer = setTimeout(fetchCustomers, search ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [search, ordering]);
+
+  const loadMore = async () => {
+    try {
+      const response = await api.get(nextUrl);
+      setCustomers((prev) => [...prev, ...response.data.results]);
+      setNextUrl(response.data.next);
+    } catch (err) {
+      console.error(err);
+    }
+  };
 
   if (loading) return <p className="text-center mt-20 text-gray-600">Loading customers...</p>;
-  if (customers.length === 0) return <p className="text-center mt-20 text-gray-600">No customers found.</p>;
 
   return (
     <div className="p-6 pt-20">
       <h1 className="text-3xl font-extrabold text-gray-900 mb-6 text-center">Customers</h1>
 
+      <div className="flex flex-wrap gap-3 mb-6">
+        <input
+          type="search"
+          value={search}
+          onChange={(e) => setSearch(e.target.value)}
+          placeholder="Search by name, phone or address..."
+          className="border border-gray-300 rounded-lg px-3 py-2 shadow-sm focus:ring-2 focus:ring-sky-400 focus:outline-none bg-white w-full max-w-md"
+        />
+        {/* Search results are always ranked by relevance */}
+        <select
+          value={ordering}
+          onChange={(e) => setOrdering(e.target.value)}
+          className="border border-gray-300 rounded-lg px-3 py-2 shadow-sm focus:ring-2 focus:ring-sky-400 focus:outline-none bg-white"
+        >
+          <option value="-date_joined">Newest first</option>
+          <option value="date_joined">Oldest first</option>
+          <option value="username">Username</option>
+          <option value="-order_count">Most orders</option>
+        </select>
+      </div>
+
+      {customers.length === 0 && <p className="text-center mt-10 text-gray-600">No customers found.</p>}
+
       <div className="overflow-x-auto">
         <div className="bg-gradient-to-r from-sky-200 to-sky-400 rounded-2xl shadow-xl overflow-hidden">
           <table className="min-w-full text-left text-gray-800">
@@ -35,6 +76,8 @@ function CustomerPage() {
                 <th className="p-4 font-semibold">Email</th>
                 <th className="p-4 font-semibold">Phone</th>
                 <th className="p-4 font-semibold">Address</th>
+                <th className="p-4 font-semibold">Orders</th>
+                <th className="p-4 font-semibold">Last Order</th>
               </tr>
             </thead>
             <tbody>
@@ -47,12 +90,25 @@ function CustomerPage() {
                   <td className="p-4">{c.email}</td>
                   <td className="p-4">{c.phone}</td>
                   <td className="p-4">{c.address}</td>
+                  <td className="p-4">{c.order_count}</td>
+                  <td className="p-4">
+                    {c.last_order_at ? new Date(c.last_order_at).toLocaleDateString() : "—"}
+                  </td>
                 </tr>
               ))}
             </tbody>
           </table>
         </div>
       </div>
+
+      {nextUrl && (
+        <button
+          onClick={loadMore}
+          className="mt-6 px-6 py-2 bg-gray-200 text-gray-800 rounded-lg shadow hover:bg-gray-300 transition"
+        >
+          Load more
+        </button>
+      )}
     </div>
   );
 }
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import { getOrders } from "../api/api";
+import { getAllOrders } from "../api/api";
 import api from "../api/api";
 import {
   LineChart,
@@ -17,25 +17,28 @@ import {
 
 function DashboardPage() {
   const [orders, setOrders] = useState([]);
-  const [customers, setCustomers] = useState([]);
-  const [staff, setStaff] = useState([]);
+  const [counts, setCounts] = useState({ customers: 0, staff: 0 });
+  const [topCustomers, setTopCustomers] = useState([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const ordersRes = await getOrders();
-        const customersRes = await api.get("users/customers/");
-        const staffRes = await api.get("users/staff/");
-
-        setOrders(Array.isArray(ordersRes.data) ? ordersRes.data : []);
-        setCustomers(Array.isArray(customersRes.data) ? customersRes.data : []);
-        setStaff(Array.isArray(staffRes.data) ? staffRes.data : []);
+        // Only the columns the charts use, without items and images
+        const allOrders = await getAllOrders({ fields: "id,status,total_price,created_at" });
+        const countsRes = await api.get("users/counts/");
+        const topRes = await api.get("users/customers/", {
+          params: { stats: true, ordering: "-order_count", page_size: 5 },
+        });
+
+        setOrders(allOrders);
+        setCounts(countsRes.data);
+        setTopCustomers(topRes.data.results);
       } catch (err) {
         console.error(err);
         setOrders([]);
-        setCustomers([]);
-        setStaff([]);
+        setCounts({ customers: 0, staff: 0 });
+        setTopCustomers([]);
       } finally {
         setLoading(false);
       }
@@ -82,14 +85,11 @@ function DashboardPage() {
   ];
   const COLORS = ["#facc15", "#22c55e", "#ef4444", "#8b5cf6"];
 
-  // Top customers by number of orders
-  const ordersPerCustomer = customers
-    .map((c) => {
-      const count = orders.filter((o) => o.customer?.id === c.id).length;
-      return { name: c.username || c.email, orders: count };
-    })
-    .sort((a, b) => b.orders - a.orders)
-    .slice(0, 5);
+  // Top customers by number of orders, counted by the server
+  const ordersPerCustomer = topCustomers.map((c) => ({
+    name: c.username || c.email,
+    orders: c.order_count,
+  }));
 
   if (loading)
     return (
@@ -126,11 +126,11 @@ function DashboardPage() {
         </div>
         <div className="bg-white p-6 rounded-xl shadow-lg border hover:shadow-xl transition text-center">
           <h2 className="text-lg font-semibold text-gray-600">Total Staff</h2>
-          <p className="text-3xl font-bold mt-3 text-gray-900">{staff.length}</p>
+          <p className="text-3xl font-bold mt-3 text-gray-900">{counts.staff}</p>
         </div>
         <div className="bg-white p-6 rounded-xl shadow-lg border hover:shadow-xl transition text-center">
           <h2 className="text-lg font-semibold text-gray-600">Total Customers</h2>
-          <p className="text-3xl font-bold mt-3 text-gray-900">{customers.length}</p>
+          <p className="text-3xl font-bold mt-3 text-gray-900">{counts.customers}</p>
         </div>
       </div>
 
@@ -1,11 +1,12 @@
 import React, { useEffect, useState } from "react";
-import { getOrders, cancelOrder } from "../api/api";
+import { getOrders, getOrdersPage, cancelOrder, subscribeToOrders } from "../api/api";
 import OrderDetails from "../components/orders/OrderDetails";
 import CreateOrder from "../components/orders/CreateOrder";
 import UpdateOrder from "../components/orders/UpdateOrder";
 
 function OrdersPage() {
   const [orders, setOrders] = useState([]);
+  const [nextUrl, setNextUrl] = useState(null);
   const [selectedOrder, setSelectedOrder] = useState(null);
   const [showCreate, setShowCreate] = useState(false);
   const [showUpdate, setShowUpdate] = useState(null);
@@ -17,7 +18,8 @@ function OrdersPage() {
     try {
       setLoading(true);
       const res = await getOrders();
-      setOrders(res.data);
+      setOrders(res.data.results);
+      setNextUrl(res.data.next);
     } catch (err) {
       console.error(err);
     } finally {
@@ -25,17 +27,53 @@ function OrdersPage() {
     }
   };
 
+  const loadMore = async () => {
+    try {
+      const res = await getOrdersPage(nextUrl);
+      setOrders((prev) => [...prev, ...res.data.results]);
+      setNextUrl(res.data.next);
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
   useEffect(() => {
     fetchOrders();
   }, []);
 
+  // Status and price changes made by staff arrive over the event stream
+  useEffect(
+    () =>
+      subscribeToOrders(
+        (change) =>
+          setOrders((prev) =>
+            prev.map((order) =>
+              // Skip events older than what is shown
+              order.id === change.id && !(change.version < order.version)
+                ? { ...order, ...change }
+                : order
+            )
+          ),
+        ({ id }) => setOrders((prev) => prev.filter((order) => order.id !== id))
+      ),
+    []
+  );
+
   const handleCancelOrder = async (orderId) => {
     try {
       setCancelingId(orderId);
-      await cancelOrder(orderId);
+      const order = orders.find((o) => o.id === orderId);
+      await cancelOrder(orderId, order?.version);
       fetchOrders();
     } catch (err) {
       console.error("Order cancel failed:", err.response?.data || err.message);
+      if (err.response?.status === 409) {
+        // Changed meanwhile (e.g. completed by staff): show it as it is now
+        const { current } = err.response.data;
+        setOrders((prev) => prev.map((o) => (o.id === current.id ? current : o)));
+        alert(err.response.data.detail);
+        return;
+      }
       alert(
         typeof err.response?.data === "object"
           ? Object.values(err.response.data).flat().join("\n")
@@ -97,7 +135,8 @@ function OrdersPage() {
         <ul className="space-y-4">
           {orders.map((order) => {
             const isEditable = order.status === "PENDING";
-            const firstImage = order.items?.[0]?.images?.[0]?.image; // first image if exists
+            const firstImage = order.items?.[0]?.images?.[0]; // first image if exists
+            const thumbnail = firstImage?.thumbnail || firstImage?.image;
 
             return (
               <li
@@ -108,9 +147,9 @@ function OrdersPage() {
                   className="cursor-pointer flex items-center space-x-3"
                   onClick={() => setSelectedOrder(order)}
                 >
-                  {firstImage && (
+                  {thumbnail && (
                     <img
-                      src={firstImage}
+                      src={thumbnail}
                       alt="order thumbnail"
                       className="w-16 h-16 object-cover border rounded-lg shadow-sm"
                     />
@@ -169,6 +208,15 @@ function OrdersPage() {
           })}
         </ul>
       )}
+
+      {nextUrl && (
+        <button
+          onClick={loadMore}
+          className="mt-6 bg-gray-200 text-gray-800 px-6 py-2 rounded-lg shadow hover:bg-gray-300 transition"
+        >
+          थप लोड गर्नुहोस्
+        </button>
+      )}
     </div>
   );
 }
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import { getOrders } from "../api/api";
+import { getAllOrders } from "../api/api";
 
 function ReportPage() {
   const [orders, setOrders] = useState([]);
@@ -8,8 +8,7 @@ function ReportPage() {
   useEffect(() => {
     const fetchOrders = async () => {
       try {
-        const res = await getOrders();
-        setOrders(Array.isArray(res.data) ? res.data : []);
+        setOrders(await getAllOrders({ fields: "id,customer,status,total_price", expand: "customer" }));
       } catch (err) {
         console.error(err);
         setOrders([]);
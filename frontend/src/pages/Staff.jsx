@@ -4,12 +4,14 @@ import api from "../api/api";
 function StaffPage() {
   const [staff, setStaff] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextUrl, setNextUrl] = useState(null);
 
   useEffect(() => {
     const fetchStaff = async () => {
       try {
         const response = await api.get("users/staff/"); // create endpoint in Django
-        setStaff(response.data);
+        setStaff(response.data.results);
+        setNextUrl(response.data.next);
       } catch (err) {
         console.error(err);
       } finally {
@@ -19,6 +21,16 @@ function StaffPage() {
     fetchStaff();
   }, []);
 
+  const loadMore = async () => {
+    try {
+      const response = await api.get(nextUrl);
+      setStaff((prev) => [...prev, ...response.data.results]);
+      setNextUrl(response.data.next);
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
   if (loading) return <p className="text-center mt-20 text-gray-600">Loading staff...</p>;
   if (staff.length === 0) return <p className="text-center mt-20 text-gray-600">No staff found.</p>;
 
@@ -55,6 +67,15 @@ function StaffPage() {
           </table>
         </div>
       </div>
+
+      {nextUrl && (
+        <button
+          onClick={loadMore}
+          className="mt-6 px-6 py-2 bg-gray-200 text-gray-800 rounded-lg shadow hover:bg-gray-300 transition"
+        >
+          Load more
+        </button>
+      )}
     </div>
   );
 }
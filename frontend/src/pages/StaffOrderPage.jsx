@@ -1,31 +1,72 @@
 import React, { useEffect, useState } from "react";
-import api from "../api/api";
+import api, { getOrders, getOrdersPage, subscribeToOrders } from "../api/api";
 
 function StaffOrdersPage() {
   const [orders, setOrders] = useState([]);
+  const [nextUrl, setNextUrl] = useState(null);
   const [filter, setFilter] = useState("ALL");
+  const [search, setSearch] = useState("");
   const [priceInputs, setPriceInputs] = useState({});
   const [statusUpdatingId, setStatusUpdatingId] = useState(null);
   const [priceUpdatingId, setPriceUpdatingId] = useState(null);
 
+  const mergePrices = (list) => {
+    const prices = {};
+    list.forEach((order) => {
+      prices[order.id] = order.total_price || "";
+    });
+    setPriceInputs((prev) => ({ ...prev, ...prices }));
+  };
+
   const fetchOrders = async () => {
     try {
-      const res = await api.get("/orders/");
-      setOrders(res.data);
+      const params = { expand: "customer" };
+      if (filter !== "ALL") params.status = filter;
+      if (search.trim()) params.q = search.trim();
+      const res = await getOrders(params);
+      setOrders(res.data.results);
+      setNextUrl(res.data.next);
+      mergePrices(res.data.results);
+    } catch (err) {
+      console.error(err);
+    }
+  };
 
-      const initialPrices = {};
-      res.data.forEach((order) => {
-        initialPrices[order.id] = order.total_price || "";
-      });
-      setPriceInputs(initialPrices);
+  const loadMore = async () => {
+    try {
+      const res = await getOrdersPage(nextUrl);
+      setOrders((prev) => [...prev, ...res.data.results]);
+      setNextUrl(res.data.next);
+      mergePrices(res.data.results);
     } catch (err) {
       console.error(err);
     }
   };
 
+  // Wait for a pause in typing before searching
   useEffect(() => {
-    fetchOrders();
-  }, []);
+    const timer = setTimeout(fetchOrders, search ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [filter, search]);
+
+  // Changes made by other staff or by customers arrive over the event stream
+  useEffect(
+    () =>
+      subscribeToOrders(
+        (change) =>
+          setOrders((prev) =>
+            // Keep the expanded customer; events only carry its id. Skip
+            // events older than what is shown.
+            prev.map((order) =>
+              order.id === change.id && !(change.version < order.version)
+                ? { ...order, ...change, customer: order.customer }
+                : order
+            )
+          ),
+        ({ id }) => setOrders((prev) => prev.filter((order) => order.id !== id))
+      ),
+    []
+  );
 
   // General update handler (status or price)
   const handleUpdate = async (id, data) => {
@@ -34,6 +75,9 @@ function StaffOrdersPage() {
       Object.keys(data).forEach((key) => {
         formData.append(key, data[key]);
       });
+      // Rejected with 409 if someone else changed the order since it was shown
+      const current = orders.find((order) => order.id === id);
+      if (current?.version !== undefined) formData.append("version", current.version);
 
       const res = await api.patch(`/orders/${id}/`, formData, {
         headers: { "Content-Type": "multipart/form-data" },
@@ -41,7 +85,7 @@ function StaffOrdersPage() {
 
       setOrders((prev) =>
         prev.map((order) =>
-          order.id === id ? { ...order, ...res.data } : order
+          order.id === id ? { ...order, ...res.data, customer: order.customer } : order
         )
       );
 
@@ -50,6 +94,17 @@ function StaffOrdersPage() {
       }
     } catch (err) {
       console.error("Update failed:", err.response?.data || err.message);
+      if (err.response?.status === 409) {
+        const { current } = err.response.data;
+        setOrders((prev) =>
+          prev.map((order) =>
+            order.id === id ? { ...current, customer: order.customer } : order
+          )
+        );
+        setPriceInputs((prev) => ({ ...prev, [id]: current.total_price }));
+        alert(err.response.data.detail);
+        return;
+      }
       alert(
         typeof err.response?.data === "object"
           ? JSON.stringify(err.response.data)
@@ -76,6 +131,8 @@ function StaffOrdersPage() {
     setStatusUpdatingId(null);
   };
 
+  // The list is filtered on the server; this only hides orders whose status
+  // was changed on this page since they were loaded
   const visibleOrders = orders.filter((o) =>
     filter === "ALL" ? true : o.status === filter
   );
@@ -92,17 +149,27 @@ function StaffOrdersPage() {
     <div className="p-6 pt-20 text-gray-900 min-h-screen bg-gray-50 ml-15 mr-15">
       <h1 className="text-3xl font-bold mb-6 text-rose-600">अर्डर व्यवस्थापन</h1>
 
-      <select
-        value={filter}
-        onChange={(e) => setFilter(e.target.value)}
-        className="border border-gray-300 rounded-lg px-3 py-2 mb-6 shadow-sm focus:ring-2 focus:ring-rose-400 focus:outline-none bg-white"
-      >
-        {statusOptions.map((opt) => (
-          <option key={opt.value} value={opt.value}>
-            {opt.label}
-          </option>
-        ))}
-      </select>
+      <div className="flex flex-wrap gap-3 mb-6">
+        <select
+          value={filter}
+          onChange={(e) => setFilter(e.target.value)}
+          className="border border-gray-300 rounded-lg px-3 py-2 shadow-sm focus:ring-2 focus:ring-rose-400 focus:outline-none bg-white"
+        >
+          {statusOptions.map((opt) => (
+            <option key={opt.value} value={opt.value}>
+              {opt.label}
+            </option>
+          ))}
+        </select>
+
+        <input
+          type="search"
+          value={search}
+          onChange={(e) => setSearch(e.target.value)}
+          placeholder="ग्राहक, फोन वा सामान खोज्नुहोस्..."
+          className="border border-gray-300 rounded-lg px-3 py-2 shadow-sm focus:ring-2 focus:ring-rose-400 focus:outline-none bg-white w-72"
+        />
+      </div>
 
       {visibleOrders.length === 0 && (
         <p className="text-gray-500 italic">कुनै अर्डर उपलब्ध छैन।</p>
@@ -173,7 +240,7 @@ function StaffOrdersPage() {
                       {item.images.map((img) => (
                         <img
                           key={img.id}
-                          src={img.image}
+                          src={img.thumbnail || img.image}
                           alt={item.order_name}
                           className="w-24 h-24 object-cover rounded-lg border border-gray-200 shadow-sm"
                         />
@@ -213,6 +280,15 @@ function StaffOrdersPage() {
           )}
         </div>
       ))}
+
+      {nextUrl && (
+        <button
+          onClick={loadMore}
+          className="px-6 py-2 bg-gray-200 text-gray-800 rounded-lg shadow hover:bg-gray-300 transition"
+        >
+          थप लोड गर्नुहोस्
+        </button>
+      )}
     </div>
   );
 }